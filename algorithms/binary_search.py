@@ -1,19 +1,43 @@
 # run this as:
 #   python3.9 -m algorithms.binary_search
 
+import abc
+import asyncio
+import bisect
+import contextvars
+import json
 import logging
+import random
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextvars import ContextVar
-from typing import Optional, Sequence, TypeVar
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
 
 import pytest
 
-from algorithms.counter import AbstractCounter, FakeCounter, get_counter
+from algorithms.counter import (
+    AbstractCounter,
+    AggregatingCounter,
+    FakeCounter,
+    get_aggregating_counter,
+    get_counter,
+    var_current_calls,
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
 
 var_counter: ContextVar[AbstractCounter] = ContextVar("counter", default=FakeCounter)
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = [int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5, 10 ** 6]
+        bench(sizes)
+        return
     logging.getLogger().setLevel(logging.DEBUG)
     pytest.main(sys.argv)
 
@@ -30,19 +54,278 @@ def get_index_binary(data: Sequence[T], value: T) -> Optional[int]:
         index = (left + right) // 2
         center = data[index]
         if center == value:
-            counter.increase(f"[{left}..{right}] {value} = {center}@{index}")
+            counter.increase("[{}..{}] {} = {}@{}", left, right, value, center, index)
             counter.finish()
             return index
         elif value < center:
-            counter.increase(f"[{left}..{right}] {value} < {center}@{index}")
+            counter.increase("[{}..{}] {} < {}@{}", left, right, value, center, index)
             right = index - 1  # exclude right
         else:
-            counter.increase(f"[{left}..{right}] {center}@{index} > {value}")
+            counter.increase("[{}..{}] {}@{} > {}", left, right, center, index, value)
             left = index + 1  # exclude left
 
     counter.finish("Not found")
 
 
+def get_indexes_binary(
+    data: Sequence[T], values: Iterable[T], presorted: bool = False
+) -> List[Optional[int]]:
+    """
+    Find indexes of all `values` in sorted `data` at once.
+
+    If `values` are sorted too, pass `presorted=True` to walk both sequences
+    in a single O(n + m) pass. Numpy arrays are searched vectorized when no
+    counter is active.
+
+    >>> get_indexes_binary([1, 3, 5, 7], [7, 2, 1])
+    [3, None, 0]
+    >>> get_indexes_binary([1, 3, 5, 7], [1, 2, 7, 8], presorted=True)
+    [0, None, 3, None]
+    """
+    if presorted:
+        return _get_indexes_merge(data, values)
+    if (
+        numpy is not None
+        and isinstance(data, numpy.ndarray)
+        and var_counter.get() is FakeCounter
+    ):
+        return _get_indexes_numpy(data, values)
+    return [get_index_binary(data, value) for value in values]
+
+
+def _get_indexes_merge(data: Sequence[T], values: Iterable[T]) -> List[Optional[int]]:
+    counter = var_counter.get()
+    result = []
+    index = 0
+    length = len(data)
+
+    for value in values:
+        while index < length:
+            center = data[index]
+            if center == value:
+                counter.increase("[{}..] {} = {}@{}", index, value, center, index)
+                counter.finish()
+                result.append(index)
+                break
+            elif value < center:
+                counter.increase("[{}..] {} < {}@{}", index, value, center, index)
+                counter.finish("Not found")
+                result.append(None)
+                break
+            counter.increase("[{}..] {}@{} > {}", index, center, index, value)
+            index += 1
+        else:
+            counter.finish("Not found")
+            result.append(None)
+
+    return result
+
+
+def _get_indexes_numpy(
+    data: "numpy.ndarray", values: Iterable[T]
+) -> List[Optional[int]]:
+    if not isinstance(values, numpy.ndarray):
+        values = numpy.asarray(list(values))
+    if not len(data):
+        return [None] * len(values)
+
+    indexes = numpy.searchsorted(data, values)
+    # searchsorted returns the insert position => check that value is there
+    found = data[numpy.minimum(indexes, len(data) - 1)] == values
+    return [
+        index if is_found else None
+        for index, is_found in zip(indexes.tolist(), found.tolist())
+    ]
+
+
+class StaticIndex(abc.ABC):
+    """
+    Read-only index over sorted data laid out for fewer cache misses.
+
+    Indexes returned by `get_index`, `lower_bound` and `upper_bound` refer
+    to the original sorted data. For data without duplicates `get_index`
+    returns the same index as `get_index_binary`; with duplicates it returns
+    the first one.
+    """
+
+    values: List[T]
+    indexes: List[int]
+    length: int
+
+    def __len__(self) -> int:
+        return self.length
+
+    @abc.abstractmethod
+    def _find_slot(self, value: T, strict: bool) -> Optional[int]:
+        """Slot of the first value >= `value` (> `value` if `strict`)"""
+
+    def lower_bound(self, value: T) -> int:
+        slot = self._find_slot(value, strict=False)
+        return self.length if slot is None else self.indexes[slot]
+
+    def upper_bound(self, value: T) -> int:
+        slot = self._find_slot(value, strict=True)
+        return self.length if slot is None else self.indexes[slot]
+
+    def get_index(self, value: T) -> Optional[int]:
+        slot = self._find_slot(value, strict=False)
+        if slot is None or self.values[slot] != value:
+            return None
+        return self.indexes[slot]
+
+
+class EytzingerIndex(StaticIndex):
+    """
+    Sorted data stored in BFS order of an implicit binary search tree:
+    children of slot `k` are `2k` and `2k + 1` (slot 0 is unused). Top levels
+    of the tree share a few cache lines and are hit by every search.
+
+    >>> index = EytzingerIndex([10, 20, 30, 40, 50])
+    >>> index.values
+    [None, 40, 20, 50, 10, 30]
+    >>> index.get_index(30), index.get_index(35)
+    (2, None)
+    >>> index.lower_bound(35), index.upper_bound(40), index.lower_bound(60)
+    (3, 4, 5)
+    """
+
+    def __init__(self, data: Sequence[T]):
+        self.length = len(data)
+        self.values = [None] * (self.length + 1)
+        self.indexes = [self.length] * (self.length + 1)
+
+        items = enumerate(data)
+        for slot in self._iter_in_order():
+            self.indexes[slot], self.values[slot] = next(items)
+
+    def _iter_in_order(self) -> Iterator[int]:
+        stack = []
+        slot = 1
+        while stack or slot <= self.length:
+            if slot <= self.length:
+                stack.append(slot)
+                slot *= 2
+            else:
+                slot = stack.pop()
+                yield slot
+                slot = slot * 2 + 1
+
+    def _find_slot(self, value: T, strict: bool) -> Optional[int]:
+        values = self.values
+        length = self.length
+        slot = 1
+
+        if strict:
+            while slot <= length:
+                slot = 2 * slot + (values[slot] <= value)
+        else:
+            while slot <= length:
+                slot = 2 * slot + (values[slot] < value)
+
+        # drop trailing right turns (ones) and the last left turn (zero)
+        slot >>= (~slot & (slot + 1)).bit_length()
+        return slot or None
+
+
+class BlockedIndex(StaticIndex):
+    """
+    Sorted data stored as an implicit B-tree: node `k` holds up to
+    `block_size` values and its children are `k * (block_size + 1) + i + 1`.
+    Every node is one contiguous run of the list, searched with `bisect`.
+
+    >>> index = BlockedIndex(list(range(0, 100, 10)), block_size=2)
+    >>> index.values
+    [40, 70, 20, 30, 50, 60, 80, 90, 0, 10]
+    >>> index.get_index(40), index.get_index(45)
+    (4, None)
+    >>> index.lower_bound(45), index.upper_bound(90), index.lower_bound(-1)
+    (5, 10, 0)
+    """
+
+    def __init__(self, data: Sequence[T], block_size: int = 16):
+        self.length = len(data)
+        self.block_size = block_size
+        self.node_count = -(-self.length // block_size)
+        size = self.node_count * block_size
+        self.values = [None] * size
+        self.indexes = [self.length] * size
+        self.counts = [0] * self.node_count
+
+        items = enumerate(data)
+        for node, position in self._iter_in_order():
+            item = next(items, None)
+            if item is None:
+                break
+            slot = node * block_size + position
+            self.indexes[slot], self.values[slot] = item
+            self.counts[node] += 1
+
+    def _iter_in_order(self) -> Iterator[Tuple[int, int]]:
+        # in-order: child 0, value 0, child 1, value 1, ..., child `block_size`
+        fan_out = self.block_size + 1
+        stack: List[List[int]] = []  # [node, position of the next value]
+        node = 0
+
+        while True:
+            while node < self.node_count:
+                stack.append([node, 0])
+                node = node * fan_out + 1
+            if not stack:
+                return
+
+            frame = stack[-1]
+            node, position = frame
+            yield node, position
+            if position + 1 < self.block_size:
+                frame[1] += 1
+            else:
+                stack.pop()
+            node = node * fan_out + position + 2
+
+    def _find_slot(self, value: T, strict: bool) -> Optional[int]:
+        find = bisect.bisect_right if strict else bisect.bisect_left
+        values = self.values
+        counts = self.counts
+        block_size = self.block_size
+        fan_out = block_size + 1
+        result = None
+        node = 0
+
+        while node < self.node_count and counts[node]:
+            start = node * block_size
+            end = start + counts[node]
+            slot = find(values, value, start, end)
+            if slot < end:
+                result = slot
+            node = node * fan_out + slot - start + 1
+
+        return result
+
+
+def bench(sizes: Iterable[int], queries: int = 100_000):
+    print(
+        "{:>10} {:>14} {:>14} {:>14}".format(
+            "size", "binary, us", "eytzinger, us", "blocked, us"
+        )
+    )
+    for size in sizes:
+        data = list(range(0, 2 * size, 2))
+        values = [random.randrange(2 * size) for _ in range(queries)]
+        timings = []
+
+        for search in (
+            lambda value: get_index_binary(data, value),
+            EytzingerIndex(data).get_index,
+            BlockedIndex(data).get_index,
+        ):
+            start = time.perf_counter()
+            for value in values:
+                search(value)
+            timings.append((time.perf_counter() - start) / queries * 1e6)
+
+        print("{:>10} {:>14.3f} {:>14.3f} {:>14.3f}".format(size, *timings))
+
+
 class TestFindBinary:
     @pytest.fixture
     def range_1000(self):
@@ -85,5 +368,161 @@ class TestFindBinary:
         assert index == 500
 
 
+class TestFindBinaryBatch:
+    @pytest.fixture
+    def range_1000(self):
+        return list(range(1000, 2000))
+
+    @pytest.fixture
+    def values(self):
+        return [-1, 999, 1000, 1001, 1500, 1998, 1999, 2000, 5000]
+
+    def test_batch(self, range_1000, values):
+        expected = [get_index_binary(range_1000, value) for value in values]
+        assert get_indexes_binary(range_1000, values) == expected
+        assert get_indexes_binary(range_1000, iter(values)) == expected
+
+    def test_presorted(self, range_1000, values):
+        expected = [get_index_binary(range_1000, value) for value in values]
+        assert get_indexes_binary(range_1000, values, presorted=True) == expected
+
+    def test_presorted_repeated(self, range_1000):
+        values = [1000, 1000, 1500, 1500, 3000, 3000]
+        assert get_indexes_binary(range_1000, values, presorted=True) == [
+            0,
+            0,
+            500,
+            500,
+            None,
+            None,
+        ]
+
+    def test_empty(self):
+        assert get_indexes_binary([], [1, 2]) == [None, None]
+        assert get_indexes_binary([], [1, 2], presorted=True) == [None, None]
+        assert get_indexes_binary([1, 2], []) == []
+
+    def test_counter(self, range_1000):
+        with get_counter(var_counter, get_index_binary) as counter:
+            get_indexes_binary(range_1000, range_1000)
+        assert counter.value == 8987
+
+    def test_presorted_counter(self, range_1000):
+        with get_counter(var_counter, get_index_binary) as counter:
+            get_indexes_binary(range_1000, range_1000, presorted=True)
+        assert counter.value == 1999
+
+    def test_numpy(self, range_1000, values):
+        np = pytest.importorskip("numpy")
+        data = np.array(range_1000)
+        expected = [get_index_binary(range_1000, value) for value in values]
+        assert get_indexes_binary(data, values) == expected
+        assert get_indexes_binary(np.array([]), values) == [None] * len(values)
+
+
+class TestAggregatingCounter:
+    @pytest.fixture
+    def range_1000(self):
+        return list(range(1000, 2000))
+
+    def test_counter(self, range_1000):
+        with get_aggregating_counter(var_counter) as counter:
+            for value in range_1000:
+                get_index_binary(data=range_1000, value=value)
+            get_index_binary(data=range_1000, value=2000)
+        assert counter.value == 8987 + 10
+        assert counter.calls == 1001
+        assert sum(counter.histogram.values()) == 1001
+        assert counter.histogram[10] == 489 + 1
+        assert 0 <= counter.time_min <= counter.time_max <= counter.time_total
+
+        data = json.loads(counter.to_json())
+        assert data["value"] == 8997
+        assert data["histogram"]["10"] == 490
+
+    def test_threads(self, range_1000):
+        def search(value):
+            return get_index_binary(data=range_1000, value=value)
+
+        with get_aggregating_counter(var_counter) as counter:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, search, value)
+                    for value in range_1000
+                ]
+                for future in futures:
+                    future.result()
+        assert counter.value == 8987
+        assert counter.calls == 1000
+
+    def test_asyncio(self, range_1000):
+        async def search(value):
+            counter = var_counter.get()
+            counter.increase("start")
+            await asyncio.sleep(0)  # interleave with other tasks mid-call
+            counter.finish()
+            return get_index_binary(data=range_1000, value=value)
+
+        async def search_all():
+            await asyncio.gather(*(search(value) for value in range_1000))
+
+        with get_aggregating_counter(var_counter) as counter:
+            asyncio.run(search_all())
+        assert counter.value == 8987 + 1000
+        assert counter.calls == 2000
+        assert counter.histogram[1] == 1000 + 1
+
+    def test_nested_counters(self):
+        outer, inner = AggregatingCounter(), AggregatingCounter()
+        outer.increase("outer")
+        for _ in range(3):
+            inner.increase("inner")
+        inner.finish()
+        outer.increase("outer")
+        outer.finish()
+        assert (outer.value, inner.value) == (2, 3)
+        # finished calls leave nothing behind in the context
+        assert var_current_calls.get() == {}
+
+    def test_disabled(self, range_1000):
+        assert var_counter.get() is FakeCounter
+        assert get_index_binary(data=range_1000, value=1999) == 999
+
+
+class TestStaticIndex:
+    @pytest.fixture(params=["eytzinger", "blocked", "blocked_2", "blocked_3"])
+    def make_index(self, request):
+        return {
+            "eytzinger": EytzingerIndex,
+            "blocked": BlockedIndex,
+            "blocked_2": lambda data: BlockedIndex(data, block_size=2),
+            "blocked_3": lambda data: BlockedIndex(data, block_size=3),
+        }[request.param]
+
+    @pytest.mark.parametrize("length", range(0, 40))
+    def test_same_as_binary(self, make_index, length):
+        data = list(range(0, 2 * length, 2))
+        index = make_index(data)
+        assert len(index) == length
+        for value in range(-2, 2 * length + 2):
+            assert index.get_index(value) == get_index_binary(data, value)
+            assert index.lower_bound(value) == bisect.bisect_left(data, value)
+            assert index.upper_bound(value) == bisect.bisect_right(data, value)
+
+    def test_duplicates(self, make_index):
+        data = [1, 1, 2, 2, 2, 3, 5, 5]
+        index = make_index(data)
+        for value in range(7):
+            found = index.get_index(value)
+            assert found == (data.index(value) if value in data else None)
+            assert index.lower_bound(value) == bisect.bisect_left(data, value)
+            assert index.upper_bound(value) == bisect.bisect_right(data, value)
+
+    def test_range_1000(self, make_index):
+        data = list(range(1000, 2000))
+        index = make_index(data)
+        assert [index.get_index(value) for value in data] == list(range(1000))
+
+
 if __name__ == "__main__":
     main()
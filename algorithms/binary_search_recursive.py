@@ -1,6 +1,7 @@
 # run this as:
 #   python3.9 -m algorithms.recursive_binary_search
 
+import array
 import logging
 import sys
 from contextvars import ContextVar
@@ -42,6 +43,37 @@ def recursive_get_index_binary(data: Sequence[T], value: T) -> Optional[int]:
     return index + offset + 1
 
 
+def recursive_get_index_bounds(
+    data: Sequence[T], value: T, low: int = 0, high: Optional[int] = None
+) -> Optional[int]:
+    """
+    Same as `recursive_get_index_binary` but recurses over `data[low:high]`
+    bounds instead of slices, so nothing is copied. Works for any indexable
+    buffer: list, `array.array`, `bytes`, `memoryview`.
+
+    >>> recursive_get_index_bounds(array.array("q", [1, 3, 5, 7]), 5)
+    2
+    >>> recursive_get_index_bounds(b"aceg", ord("b"))
+    """
+    counter = var_counter.get()
+    counter.increase("")
+
+    if high is None:
+        high = len(data)
+
+    if low >= high:
+        return None
+
+    index = low + (high - low) // 2
+    center = data[index]
+
+    if center == value:
+        return index
+    elif value < center:
+        return recursive_get_index_bounds(data, value, low, index)
+    return recursive_get_index_bounds(data, value, index + 1, high)
+
+
 class TestFindBinary:
     @pytest.fixture
     def range_1000(self):
@@ -84,5 +116,43 @@ class TestFindBinary:
         assert index == 500
 
 
+class TestFindBounds:
+    @pytest.fixture
+    def range_1000(self):
+        return list(range(1000, 2000))
+
+    @pytest.mark.parametrize("value", [-1, 999, 1000, 1001, 1500, 1999, 2000])
+    @pytest.mark.parametrize(
+        "to_data",
+        [
+            list,
+            lambda values: array.array("q", values),
+            lambda values: memoryview(array.array("q", values)),
+        ],
+    )
+    def test_same_as_slices(self, range_1000, value, to_data):
+        with get_counter(var_counter, recursive_get_index_binary) as expected:
+            expected_index = recursive_get_index_binary(range_1000, value)
+        with get_counter(var_counter, recursive_get_index_bounds) as counter:
+            index = recursive_get_index_bounds(to_data(range_1000), value)
+        assert index == expected_index
+        assert counter.value == expected.value
+
+    def test_complexity_range_1000(self, range_1000):
+        with get_counter(var_counter, recursive_get_index_bounds) as counter:
+            for value in range_1000:
+                assert recursive_get_index_bounds(range_1000, value) == value - 1000
+        assert counter.value == 8987
+
+    def test_bytes(self):
+        data = bytes(range(0, 256, 2))
+        for value in range(256):
+            expected = recursive_get_index_binary(data, value)
+            assert recursive_get_index_bounds(data, value) == expected
+
+    def test_empty(self):
+        assert recursive_get_index_bounds([], 1) is None
+
+
 if __name__ == "__main__":
     main()
@@ -5,50 +5,154 @@ from __future__ import annotations
 
 import dataclasses
 import logging
+import operator
+import random
 import string
 import sys
+import time
 from enum import Enum
-from typing import Any, Iterable, Optional, Tuple, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sized,
+    Tuple,
+    TypeVar,
+)
 
 import pytest
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = [int(size) for size in sys.argv[2:]] or [1000, 5000]
+        bench(sizes)
+        return
     logging.getLogger().setLevel(logging.DEBUG)
     pytest.main(sys.argv)
 
 
 T = TypeVar("T")
 
+MISSING = object()  # end of iterator, items themselves may be None
+VALUE = operator.itemgetter(0)  # value of a `(value, payload)` pair
+
 
 @dataclasses.dataclass
 class BinaryTree:
     node: Optional[RootNode] = None
 
+    @classmethod
+    def from_sorted(
+        cls, items: Iterable[Tuple[T, Any]], length: Optional[int] = None
+    ) -> BinaryTree:
+        """
+        Build a perfectly balanced tree from `(value, payload)` pairs sorted by
+        value in O(n). Items are consumed in order, so a generator is streamed
+        when its `length` is given.
+        """
+        if length is None:
+            items = items if isinstance(items, Sized) else list(items)
+            length = len(items)
+
+        tree = cls()
+        items = check_sorted(items, key=VALUE)
+        try:
+            tree.node = tree.build(items, length, parent=None)
+        except StopIteration:
+            raise ValueError("Less than {} items".format(length)) from None
+        if next(items, MISSING) is not MISSING:
+            raise ValueError("More than {} items".format(length))
+        return tree
+
+    def build(
+        self, items: Iterator[Tuple[T, Any]], count: int, parent: Optional[BaseNode]
+    ) -> Optional[BaseNode]:
+        """Subtree of the next `count` items"""
+        if not count:
+            return None
+
+        left_count = (count - 1) // 2
+        node = self.new_node(value=None, payload=None, parent=parent)
+        node.left = self.build(items, left_count, parent=node)
+        node.value, node.payload = next(items)
+        node.right = self.build(items, count - 1 - left_count, parent=node)
+        node.update()
+        return node
+
+    @staticmethod
+    def new_node(value: T, payload: Any, parent: Optional[BaseNode]) -> BaseNode:
+        if parent is None:
+            return RootNode(value=value, payload=payload, left=None, right=None)
+        return Node(parent=parent, value=value, payload=payload, left=None, right=None)
+
+    def merge(self, other: BinaryTree) -> BinaryTree:
+        """New tree with the nodes of both trees; payloads of `other` win"""
+        items = merge_sorted_unique(
+            ((node.value, node.payload) for node in self),
+            ((node.value, node.payload) for node in other),
+            key=VALUE,
+        )
+        return self.from_sorted(list(items))
+
     def add(self, value: T, payload: Any):
-        if not self.node:
+        if self.node is None:
             self.node = RootNode(value=value, payload=payload, left=None, right=None)
             return
 
         self.node.add(value=value, payload=payload)
 
+    def find(self, value: T) -> Optional[BaseNode]:
+        if self.node is None:
+            return None
+        return self.node.find(value)
+
     def traverse(self) -> Iterable[Tuple[int, BaseNode]]:
-        if not self.node:
+        if self.node is None:
             return
         yield from self.node.traverse()
 
     def __iter__(self):
-        if not self.node:
+        if self.node is None:
             return
         yield from self.node
 
+    def __reversed__(self):
+        if self.node is None:
+            return
+        yield from reversed(self.node)
+
+    def iter_range(self, low: T, high: T) -> Iterator[BaseNode]:
+        if self.node is None:
+            return
+        yield from self.node.iter_range(low, high)
+
     def __len__(self):
-        if not self.node:
+        if self.node is None:
             return 0
         return len(self.node)
 
+    def rank(self, value: T) -> int:
+        if self.node is None:
+            return 0
+        return self.node.rank(value)
+
+    def select(self, index: int) -> BaseNode:
+        if self.node is None:
+            raise IndexError(index)
+        return self.node.select(index)
+
+    def count_range(self, low: T, high: T) -> int:
+        if self.node is None:
+            return 0
+        return self.node.count_range(low, high)
+
     def iter_wide(self):
-        if not self.node:
+        if self.node is None:
             return
         yield from self.node.iter_wide()
 
@@ -59,8 +163,8 @@ class Position(Enum):
     GREATER = 3
 
 
-@dataclasses.dataclass
-class NodeWithPosition:
+class NodeWithPosition(NamedTuple):
+    # tuple => no per-instance dict on every insert and lookup
     node: BaseNode
     position: Position
 
@@ -81,15 +185,21 @@ class BaseNode:
                 return NodeWithPosition(node=node, position=Position.EQUAL)
             elif value < node.value:
                 # check left tree
-                if not node.left:
+                if node.left is None:
                     return NodeWithPosition(node=node, position=Position.LESS)
                 node = node.left
             elif node.value < value:
                 # check right tree
-                if not node.right:
+                if node.right is None:
                     return NodeWithPosition(node=node, position=Position.GREATER)
                 node = node.right
 
+    def find(self, value: T) -> Optional[BaseNode]:
+        node_to_add = self.find_node_to_add(value=value)
+        if node_to_add.position == Position.EQUAL:
+            return node_to_add.node
+        return None
+
     def add(self, value: T, payload: Any):
         node_to_add = self.find_node_to_add(value=value)
 
@@ -111,21 +221,75 @@ class BaseNode:
         else:
             raise ValueError(node_to_add.position)
 
+        node.increase_parent_sizes()
+
+    def increase_parent_sizes(self):
+        node = self.parent
+        while node is not None:
+            node.size += 1
+            node = node.parent
+
     def traverse(self) -> Iterable[Tuple[int, BaseNode]]:
-        if self.left:
-            for level_, node in self.left.traverse():
-                yield level_ + 1, node
-        yield 0, self
-        if self.right:
-            for level_, node in self.right.traverse():
-                yield level_ + 1, node
+        # explicit stack of (node, level) => O(1) per node, no recursion limit
+        stack = []
+        node = self
+        level = 0
 
-    def __iter__(self):
-        if self.left:
-            yield from self.left
-        yield self
-        if self.right:
-            yield from self.right
+        while stack or node is not None:
+            while node is not None:
+                stack.append((node, level))
+                node = node.left
+                level += 1
+            node, level = stack.pop()
+            yield level, node
+            node = node.right
+            level += 1
+
+    def __iter__(self) -> Iterator[BaseNode]:
+        stack = []
+        node = self
+
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
+
+    def __reversed__(self) -> Iterator[BaseNode]:
+        stack = []
+        node = self
+
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
+            yield node
+            node = node.left
+
+    def iter_range(self, low: T, high: T) -> Iterator[BaseNode]:
+        """Nodes with `low <= value < high` in order"""
+        # seek to `low`: stack keeps nodes that are >= low on the way down
+        stack = []
+        node = self
+        while node is not None:
+            if node.value < low:
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+
+        while stack:
+            node = stack.pop()
+            if not node.value < high:
+                return
+            yield node
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
 
     def iter_wide(self):
         current_nodes = [self]
@@ -134,9 +298,9 @@ class BaseNode:
         while current_nodes:
             for node in current_nodes:
                 yield node
-                if node.left:
+                if node.left is not None:
                     next_nodes.append(node.left)
-                if node.right:
+                if node.right is not None:
                     next_nodes.append(node.right)
             if not next_nodes:
                 return
@@ -144,7 +308,54 @@ class BaseNode:
             next_nodes = []
 
     def __len__(self):
-        return sum(1 for _node in self)
+        return self.size
+
+    def update(self):
+        """Recalculate size from the children"""
+        size = 1
+        if self.left is not None:
+            size += self.left.size
+        if self.right is not None:
+            size += self.right.size
+        self.size = size
+
+    def rank(self, value: T) -> int:
+        """Number of values less than `value`"""
+        node = self
+        rank = 0
+
+        while node is not None:
+            if node.value < value:
+                rank += 1 + (node.left.size if node.left is not None else 0)
+                node = node.right
+            else:
+                node = node.left
+
+        return rank
+
+    def select(self, index: int) -> BaseNode:
+        """Node with the `index`-th smallest value"""
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+
+        node = self
+        while True:
+            left_size = node.left.size if node.left is not None else 0
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node
+            else:
+                index -= left_size + 1
+                node = node.right
+
+    def count_range(self, low: T, high: T) -> int:
+        """Number of values in `low <= value < high`"""
+        if not low < high:
+            return 0
+        return self.rank(high) - self.rank(low)
 
     # TODO: Add `delete` method
 
@@ -152,16 +363,241 @@ class BaseNode:
 @dataclasses.dataclass
 class RootNode(BaseNode):
     parent: None = None
+    size: int = 1
 
 
 @dataclasses.dataclass
 class Node(BaseNode):
     parent: BaseNode
+    size: int = 1
 
 
 # TODO: Implement EmptyRootNode and extract all logic of BinaryTree there
 
 
+@dataclasses.dataclass
+class BalancedBinaryTree(BinaryTree):
+    """
+    AVL tree: heights of the left and right subtrees of every node differ by
+    at most one, so the depth is O(log n) even for sorted input.
+    """
+
+    node: Optional[BalancedNode] = None
+
+    @staticmethod
+    def new_node(
+        value: T, payload: Any, parent: Optional[BalancedNode]
+    ) -> BalancedNode:
+        return BalancedNode(
+            parent=parent, value=value, payload=payload, left=None, right=None
+        )
+
+    def add(self, value: T, payload: Any):
+        if self.node is None:
+            self.node = BalancedNode(
+                value=value, payload=payload, left=None, right=None
+            )
+            return
+
+        node_to_add = self.node.find_node_to_add(value=value)
+        parent = node_to_add.node
+
+        if node_to_add.position == Position.EQUAL:
+            # same value => overwrite payload
+            parent.payload = payload
+            return
+
+        node = BalancedNode(
+            parent=parent, value=value, payload=payload, left=None, right=None
+        )
+        if node_to_add.position == Position.LESS:
+            parent.left = node
+        elif node_to_add.position == Position.GREATER:
+            parent.right = node
+        else:
+            raise ValueError(node_to_add.position)
+
+        node.increase_parent_sizes()
+        self.rebalance(parent)
+
+    def rebalance(self, node: Optional[BalancedNode]):
+        """Restore heights and balance from `node` up to the root"""
+        while node is not None:
+            old_height = node.height
+            node.update_height()
+            balance = node.balance
+
+            if balance > 1:
+                # left subtree is too high
+                if node.left.balance < 0:
+                    self.rotate_left(node.left)
+                node = self.rotate_right(node)
+            elif balance < -1:
+                # right subtree is too high
+                if 0 < node.right.balance:
+                    self.rotate_right(node.right)
+                node = self.rotate_left(node)
+
+            if node.height == old_height:
+                # subtree height is the same => ancestors are balanced
+                return
+            node = node.parent
+
+    def rotate_left(self, node: BalancedNode) -> BalancedNode:
+        pivot = node.right
+        node.right = pivot.left
+        if pivot.left is not None:
+            pivot.left.parent = node
+        pivot.left = node
+        self.replace_child(node, pivot)
+        node.update_height()
+        pivot.update_height()
+        return pivot
+
+    def rotate_right(self, node: BalancedNode) -> BalancedNode:
+        pivot = node.left
+        node.left = pivot.right
+        if pivot.right is not None:
+            pivot.right.parent = node
+        pivot.right = node
+        self.replace_child(node, pivot)
+        node.update_height()
+        pivot.update_height()
+        return pivot
+
+    def replace_child(self, node: BalancedNode, new_node: BalancedNode):
+        """Put `new_node` in place of `node`, and `node` under `new_node`"""
+        parent = node.parent
+        new_node.parent = parent
+        node.parent = new_node
+        if parent is None:
+            self.node = new_node
+        elif parent.left is node:
+            parent.left = new_node
+        else:
+            parent.right = new_node
+
+    @property
+    def height(self) -> int:
+        return self.node.height if self.node is not None else 0
+
+
+@dataclasses.dataclass
+class BalancedNode(BaseNode):
+    parent: Optional[BalancedNode] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+    height: int = 1
+    size: int = 1
+
+    @property
+    def balance(self) -> int:
+        left = self.left.height if self.left is not None else 0
+        right = self.right.height if self.right is not None else 0
+        return left - right
+
+    def update_height(self):
+        """Recalculate height and size from the children"""
+        height = size = 0
+        if self.left is not None:
+            height = self.left.height
+            size = self.left.size
+        if self.right is not None:
+            height = max(height, self.right.height)
+            size += self.right.size
+        self.height = height + 1
+        self.size = size + 1
+
+    def update(self):
+        self.update_height()
+
+
+def check_sorted(
+    items: Iterable[T], key: Optional[Callable[[T], Any]] = None
+) -> Iterator[T]:
+    """
+    Pass `items` through, raise ValueError when keys are not strictly
+    increasing
+
+    >>> list(check_sorted([1, 2, 2]))
+    Traceback (most recent call last):
+    ...
+    ValueError: Values are not sorted: 2 >= 2
+    """
+    previous = MISSING
+    for item in items:
+        value = item if key is None else key(item)
+        if previous is not MISSING and not previous < value:
+            raise ValueError(
+                "Values are not sorted: {!r} >= {!r}".format(previous, value)
+            )
+        yield item
+        previous = value
+
+
+def merge_sorted_unique(
+    a: Iterator[T], b: Iterator[T], key: Optional[Callable[[T], Any]] = None
+) -> Iterator[T]:
+    """
+    Merge two iterators sorted by unique keys; on equal keys the item of `b`
+    is taken
+
+    >>> list(merge_sorted_unique(iter([(1, "a"), (3, "a")]), iter([(3, "b")]), VALUE))
+    [(1, 'a'), (3, 'b')]
+    """
+    a_item = next(a, MISSING)
+    b_item = next(b, MISSING)
+
+    while a_item is not MISSING and b_item is not MISSING:
+        a_key = a_item if key is None else key(a_item)
+        b_key = b_item if key is None else key(b_item)
+        if a_key < b_key:
+            yield a_item
+            a_item = next(a, MISSING)
+        elif b_key < a_key:
+            yield b_item
+            b_item = next(b, MISSING)
+        else:
+            yield b_item
+            a_item = next(a, MISSING)
+            b_item = next(b, MISSING)
+
+    if a_item is not MISSING:
+        yield a_item
+        yield from a
+    if b_item is not MISSING:
+        yield b_item
+        yield from b
+
+
+def bench(sizes: Iterable[int]):
+    print(
+        "{:>8} {:>16} {:>12} {:>12}".format("size", "input", "unbalanced", "balanced")
+    )
+    for size in sizes:
+        inputs = {
+            "sorted": list(range(size)),
+            "reverse-sorted": list(range(size, 0, -1)),
+            "random": random.sample(range(size), size),
+        }
+        for name, values in inputs.items():
+            timings = [
+                measure(make_tree, values)
+                for make_tree in (BinaryTree, BalancedBinaryTree)
+            ]
+            print("{:>8} {:>16} {:>11.3f}s {:>11.3f}s".format(size, name, *timings))
+
+
+def measure(make_tree: Callable[[], BinaryTree], values: List[T]) -> float:
+    start = time.perf_counter()
+    tree = make_tree()
+    for value in values:
+        tree.add(value=value, payload=None)
+    for value in values:
+        tree.find(value)
+    return time.perf_counter() - start
+
+
 class TestBinaryTree:
     @pytest.fixture
     def tree(self):
@@ -190,10 +626,195 @@ class TestBinaryTree:
         assert len(tree) == 9
         # assert False
 
-    def test_empty(self):
+    def test_order_statistics(self, tree):
+        values = [node.value for node in tree]
+        for index, value in enumerate(values):
+            assert tree.select(index).value == value
+            assert tree.rank(value) == index
+        assert tree.select(-1).value == 73
+        assert tree.rank(0) == 0
+        assert tree.rank(100) == 9
+        assert tree.count_range(25, 50) == 4
+        assert tree.count_range(0, 100) == 9
+        assert tree.count_range(50, 25) == 0
+        with pytest.raises(IndexError):
+            tree.select(9)
+
+    def test_iterators(self, tree):
+        values = [node.value for node in tree]
+        assert values == [20, 25, 26, 30, 35, 50, 71, 72, 73]
+        assert [node.value for node in reversed(tree)] == values[::-1]
+        wide = [50, 30, 71, 25, 35, 72, 20, 26, 73]
+        assert [node.value for node in tree.iter_wide()] == wide
+        levels = [3, 2, 3, 1, 2, 0, 1, 2, 3]
+        assert [(level, node.value) for level, node in tree.traverse()] == list(
+            zip(levels, values)
+        )
+
+    @pytest.mark.parametrize("low", range(15, 80, 5))
+    @pytest.mark.parametrize("high", range(15, 80, 5))
+    def test_iter_range(self, tree, low, high):
+        expected = [node.value for node in tree if low <= node.value < high]
+        assert [node.value for node in tree.iter_range(low, high)] == expected
+        assert len(expected) == tree.count_range(low, high)
+
+    def test_deep(self):
         tree = BinaryTree()
-        # TODO: Test all methods
-        pass
+        for value in range(5000):
+            tree.add(value=value, payload=None)
+        assert [node.value for node in tree] == list(range(5000))
+        assert [node.value for node in reversed(tree)] == list(range(4999, -1, -1))
+        assert max(level for level, _node in tree.traverse()) == 4999
+        assert [node.value for node in tree.iter_range(4990, 6000)] == list(
+            range(4990, 5000)
+        )
+
+    def test_find(self, tree):
+        assert tree.find(35).payload == "d"
+        assert tree.find(50).payload == "b"
+        assert tree.find(36) is None
+
+    @pytest.mark.parametrize("tree_class", [BinaryTree, BalancedBinaryTree])
+    def test_empty(self, tree_class):
+        tree = tree_class()
+        assert tree.find(1) is None
+        assert list(tree) == []
+        assert list(reversed(tree)) == []
+        assert list(tree.traverse()) == []
+        assert list(tree.iter_wide()) == []
+        assert list(tree.iter_range(0, 1)) == []
+        assert len(tree) == 0
+        assert tree.rank(1) == 0
+        assert tree.count_range(0, 1) == 0
+        with pytest.raises(IndexError):
+            tree.select(0)
+        assert len(tree.merge(tree_class())) == 0
+        assert len(tree_class.from_sorted([])) == 0
+
+        tree.add(value=1, payload="a")
+        assert [(node.value, node.payload) for node in tree] == [(1, "a")]
+        assert tree.select(0).value == 1
+
+
+class TestFromSorted:
+    @pytest.fixture(params=[BinaryTree, BalancedBinaryTree])
+    def tree_class(self, request):
+        return request.param
+
+    @pytest.mark.parametrize("length", [0, 1, 2, 3, 7, 8, 100, 1000])
+    def test_from_sorted(self, tree_class, length):
+        items = [(value, str(value)) for value in range(length)]
+        tree = tree_class.from_sorted(items)
+        assert type(tree) is tree_class
+        assert [(node.value, node.payload) for node in tree] == items
+        assert len(tree) == length
+        if length:
+            assert max(level for level, _node in tree.traverse()) + 1 == (
+                length.bit_length()
+            )
+            assert tree.node.parent is None
+        for node in tree:
+            for child in (node.left, node.right):
+                assert child is None or child.parent is node
+
+    def test_balanced(self):
+        tree = BalancedBinaryTree.from_sorted((value, None) for value in range(100))
+        for node in tree:
+            assert abs(node.balance) <= 1
+        tree.add(value=100, payload=None)
+        tree.add(value=-1, payload=None)
+        assert [node.value for node in tree] == list(range(-1, 101))
+        assert tree.select(50).value == 49
+
+    def test_generator(self, tree_class):
+        items = ((value, None) for value in range(10))
+        tree = tree_class.from_sorted(items, length=10)
+        assert [node.value for node in tree] == list(range(10))
+
+    def test_errors(self, tree_class):
+        with pytest.raises(ValueError):
+            tree_class.from_sorted([(1, None), (1, None)])
+        with pytest.raises(ValueError):
+            tree_class.from_sorted([(2, None), (1, None)])
+        with pytest.raises(ValueError):
+            tree_class.from_sorted(iter([(1, None)]), length=2)
+        with pytest.raises(ValueError):
+            tree_class.from_sorted(iter([(1, None), (2, None)]), length=1)
+
+    def test_merge(self, tree_class):
+        a = tree_class.from_sorted([(value, "a") for value in range(0, 20, 2)])
+        b = tree_class.from_sorted([(value, "b") for value in range(0, 30, 3)])
+        merged = a.merge(b)
+        assert type(merged) is tree_class
+        values = sorted(set(range(0, 20, 2)) | set(range(0, 30, 3)))
+        assert [node.value for node in merged] == values
+        assert merged.find(6).payload == "b"
+        assert merged.find(4).payload == "a"
+        assert merged.find(27).payload == "b"
+        assert len(tree_class().merge(a)) == len(a)
+        assert len(a.merge(tree_class())) == len(a)
+
+
+class TestBalancedBinaryTree:
+    @pytest.mark.parametrize(
+        "values",
+        [
+            list(range(1000)),
+            list(range(1000, 0, -1)),
+            random.Random(1).sample(range(1000), 1000),
+            [50, 30, 40, 35, 38, 37, 70, 60, 65, 62, 63],
+        ],
+    )
+    def test_add(self, values):
+        tree = BalancedBinaryTree()
+        for value in values:
+            tree.add(value=value, payload=str(value))
+
+        assert [node.value for node in tree] == sorted(values)
+        assert len(tree) == len(values)
+        assert sorted(node.value for node in tree.iter_wide()) == sorted(values)
+        assert [node.value for _level, node in tree.traverse()] == sorted(values)
+        # AVL height is at most 1.44 * log2(n + 2)
+        assert tree.height <= 1.45 * (len(values) + 2).bit_length()
+        for node in tree:
+            assert abs(node.balance) <= 1
+            assert node.parent is None or node in (node.parent.left, node.parent.right)
+            assert node.height == 1 + max(
+                node.left.height if node.left is not None else 0,
+                node.right.height if node.right is not None else 0,
+            )
+        for value in values:
+            assert tree.find(value).payload == str(value)
+
+        ordered = sorted(values)
+        for node in tree:
+            assert node.size == 1 + sum(
+                child.size for child in (node.left, node.right) if child is not None
+            )
+        for index, value in enumerate(ordered):
+            assert tree.select(index).value == value
+            assert tree.rank(value) == index
+        low, high = len(values) // 4, len(values) * 3 // 4
+        assert tree.count_range(ordered[low], ordered[high]) == high - low
+
+    def test_overwrite(self):
+        tree = BalancedBinaryTree()
+        for value in range(10):
+            tree.add(value=value, payload="a")
+        for value in range(10):
+            tree.add(value=value, payload="b")
+        assert len(tree) == 10
+        assert tree.node.size == 10
+        assert {node.payload for node in tree} == {"b"}
+
+    def test_empty(self):
+        tree = BalancedBinaryTree()
+        assert len(tree) == 0
+        assert list(tree) == []
+        assert list(tree.traverse()) == []
+        assert list(tree.iter_wide()) == []
+        assert tree.find(1) is None
+        assert tree.height == 0
 
 
 if __name__ == "__main__":
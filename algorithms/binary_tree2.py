@@ -1,49 +1,71 @@
 from __future__ import annotations
 
 import dataclasses
+import random
+import sys
 from collections import deque
-from typing import Iterator, Optional, Sequence, TypeVar
+from typing import Iterable, Iterator, Optional, Sized, Tuple, TypeVar
+
+import pytest
+
+from algorithms.binary_tree import MISSING, check_sorted, merge_sorted_unique
 
 T = TypeVar("T")
 
 
 @dataclasses.dataclass(init=False, repr=False)
 class Node:
+    # `tree` and `cached_depth` make `depth` O(1) amortized: without them it
+    # walks up to the root, which is O(n) per call on a degenerate tree
+    __slots__ = ("parent", "value", "left", "right", "tree", "cached_depth")
+
     parent: Node
     value: T
     left: Optional[Node]
     right: Optional[Node]
+    tree: BinaryTree
+    # (depth, tree version it was calculated for)
+    cached_depth: Tuple[int, int]
 
     def __init__(self, value: T, parent: Node):
         self.value = value
         self.parent = parent
         self.left = self.right = None
+        self.tree = parent.tree
+        self.cached_depth = (0, -1)
 
     def __repr__(self):
         return f"<Node: {self.value} depth={self.depth}>"
 
     def insert(self, value: T):
-        if value < self.value:
-            # add to the left
-            if child := self.left:
-                child.insert(value)
-            else:
-                self.left = Node(value=value, parent=self)
-        elif self.value < value:
-            # add to the right
-            if child := self.right:
-                child.insert(value)
+        node = self
+
+        while True:
+            if value < node.value:
+                # add to the left
+                if (child := node.left) is None:
+                    node.left = Node(value=value, parent=node)
+                    return
+            elif node.value < value:
+                # add to the right
+                if (child := node.right) is None:
+                    node.right = Node(value=value, parent=node)
+                    return
             else:
-                self.right = Node(value=value, parent=self)
-        else:
-            raise ValueError("Duplicate value: {!r}".format(value))
+                raise ValueError("Duplicate value: {!r}".format(value))
+            node = child
 
     def traverse_deep(self) -> Iterator[Node]:
-        if child := self.left:
-            yield from child.traverse_deep()
-        yield self
-        if child := self.right:
-            yield from child.traverse_deep()
+        nodes = []
+        node = self
+
+        while nodes or node is not None:
+            while node is not None:
+                nodes.append(node)
+                node = node.left
+            node = nodes.pop()
+            yield node
+            node = node.right
 
     def traverse_wide(self) -> Iterator[Node]:
         nodes = deque([self])
@@ -60,37 +82,114 @@ class Node:
 
     @property
     def depth(self) -> int:
+        # depth is cached until the tree structure changes (see `delete`);
+        # walk up only to the closest ancestor with a valid cache
+        version = self.tree.version
+        path = []
         node = self
-        depth = 0
 
-        while node := node.parent:
+        while node.parent is not None:
+            depth, depth_version = node.cached_depth
+            if depth_version == version:
+                break
+            path.append(node)
+            node = node.parent
+        else:
+            depth = 0
+
+        for node in reversed(path):
             depth += 1
+            node.cached_depth = (depth, version)
 
         return depth
 
     def __contains__(self, value: T):
-        return bool(self.find(value))
+        return self.find(value) is not None
 
     def find(self, value: T) -> Optional[Node]:
-        if value == self.value:
-            return self
-        elif value < self.value:
-            # look left
-            if child := self.left:
-                return child.find(value)
-            return None
-        elif self.value < value:
-            # look right
-            if child := self.right:
-                return child.find(value)
-            return None
+        node = self
+
+        while node is not None:
+            if value == node.value:
+                return node
+            elif value < node.value:
+                # look left
+                node = node.left
+            else:
+                # look right
+                node = node.right
+
+        return None
 
     def delete(self, value: T):
+        """
+        >>> tree = BinaryTree()
+        >>> for value in (5, 3, 8, 1, 4, 9):
+        ...     tree.insert(value)
+        >>> tree.delete(3)  # two children
+        >>> tree.delete(8)  # one child
+        >>> tree.delete(1)  # leaf
+        >>> tree.delete(5)  # root
+        >>> print(tree)
+          [4]
+        [9]
+        >>> [node.value for node in tree.traverse_deep()]
+        [4, 9]
+        """
         node = self.find(value)
-        if not node:
+        if node is None:
+            return
+
+        if node.left is not None and node.right is not None:
+            # two children => take the next value and delete its node instead
+            successor = node.right
+            while successor.left is not None:
+                successor = successor.left
+            node.value = successor.value
+            node = successor
+
+        # node has one child at most
+        child = node.left if node.left is not None else node.right
+        parent = node.parent
+
+        if parent is None:
+            # root is the tree itself => move child into it
+            node.replace_with(child)
+        elif parent.left is node:
+            parent.left = child
+        else:
+            parent.right = child
+
+        if parent is not None and child is not None:
+            child.parent = parent
+
+        # depths of the moved subtree changed
+        self.tree.version += 1
+
+    def build(self, values: Iterator[T], count: int):
+        """Fill this node and its new subtree with the next `count` values"""
+        left_count = (count - 1) // 2
+        right_count = count - 1 - left_count
+
+        if left_count:
+            self.left = Node(value=None, parent=self)
+            self.left.build(values, left_count)
+        self.value = next(values)
+        if right_count:
+            self.right = Node(value=None, parent=self)
+            self.right.build(values, right_count)
+
+    def replace_with(self, node: Optional[Node]):
+        if node is None:
+            self.value = self.left = self.right = None
             return
 
-        raise NotImplementedError()
+        self.value = node.value
+        self.left = node.left
+        self.right = node.right
+        for child in (self.left, self.right):
+            if child is not None:
+                child.parent = self
 
 
 @dataclasses.dataclass(init=False, repr=False)
@@ -103,6 +202,57 @@ class BinaryTree(Node):
 
     def __init__(self):
         self.parent = self.value = self.left = self.right = None
+        self.tree = self
+        self.version = 0
+
+    @classmethod
+    def from_sorted(
+        cls, values: Iterable[T], length: Optional[int] = None
+    ) -> BinaryTree:
+        """
+        Build a perfectly balanced tree from sorted values in O(n). Values are
+        consumed in order, so a generator is streamed when `length` is given.
+
+        >>> print(BinaryTree.from_sorted(iter(range(5)), length=5))
+          [0]
+            [1]
+        [2]
+          [3]
+            [4]
+        >>> BinaryTree.from_sorted(iter([None]), length=0)
+        Traceback (most recent call last):
+        ...
+        ValueError: More than 0 values
+        """
+        if length is None:
+            values = values if isinstance(values, Sized) else list(values)
+            length = len(values)
+
+        tree = cls()
+        values = check_sorted(values)
+        try:
+            if length:
+                tree.build(values, length)
+        except StopIteration:
+            raise ValueError("Less than {} values".format(length)) from None
+        if next(values, MISSING) is not MISSING:
+            raise ValueError("More than {} values".format(length))
+        return tree
+
+    def merge(self, other: BinaryTree) -> BinaryTree:
+        """
+        New tree with the values of both trees
+
+        >>> a = BinaryTree.from_sorted([1, 3, 5])
+        >>> b = BinaryTree.from_sorted([2, 3, 4])
+        >>> [node.value for node in a.merge(b).traverse_deep()]
+        [1, 2, 3, 4, 5]
+        """
+        values = merge_sorted_unique(
+            (node.value for node in self.traverse_deep()),
+            (node.value for node in other.traverse_deep()),
+        )
+        return self.from_sorted(list(values))
 
     def insert(self, value: T):
         if self.value is None:
@@ -110,6 +260,21 @@ class BinaryTree(Node):
         else:
             super().insert(value)
 
+    def find(self, value: T) -> Optional[Node]:
+        if self.value is None:
+            return None
+        return super().find(value)
+
+    def traverse_deep(self) -> Iterator[Node]:
+        if self.value is None:
+            return iter(())
+        return super().traverse_deep()
+
+    def traverse_wide(self) -> Iterator[Node]:
+        if self.value is None:
+            return iter(())
+        return super().traverse_wide()
+
     def __repr__(self):
         return "\n".join(
             "{}[{}]".format(" " * node.depth * 2, node.value)
@@ -117,33 +282,11 @@ class BinaryTree(Node):
         )
 
 
-def fill_values(tree: BinaryTree, values: Sequence[T]):
-    middle = (len(values) - 1) // 2
-    tree.insert(values[middle])
-
-    if len(values) > 3:
-        fill_values(tree, values[:middle])
-        fill_values(tree, values[middle + 1 :])
-        return
-
-    for i in range(1, middle + 1):
-        tree.insert(values[middle - i])
-        tree.insert(values[middle + i])
-
-    for i in range(middle * 2 + 1, len(values)):
-        tree.insert(values[i])
-
-
 def main():
-    tree = BinaryTree()
-
     values = list(range(0, 63))
 
-    # for value in values:
-    #     tree.insert(value)
-
-    # insert already balanced tree
-    fill_values(tree, values)
+    # build balanced tree in O(n)
+    tree = BinaryTree.from_sorted(values)
 
     print(tree)
 
@@ -159,7 +302,70 @@ def main():
     print("Search {}: {}".format(value, tree.find(value)))
     print("{} in tree: {}".format(value, value in tree))
 
-    tree.delete(10)
+    for value in values[::2]:
+        tree.delete(value)
+    print("After deleting even values:")
+    print(tree)
+
+
+class TestBinaryTree:
+    @staticmethod
+    def check(tree: BinaryTree, values: Iterable[T]):
+        """Compare with sorted `values`, check order, parent links and depths"""
+        assert [node.value for node in tree.traverse_deep()] == sorted(values)
+        depths = {id(tree): 0}
+        for node in tree.traverse_wide():
+            assert node.tree is tree
+            assert node.depth == depths[id(node)]
+            for child, in_order in ((node.left, True), (node.right, False)):
+                if child is None:
+                    continue
+                assert child.parent is node
+                assert (child.value < node.value) == in_order
+                depths[id(child)] = depths[id(node)] + 1
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_insert_delete(self, seed):
+        rnd = random.Random(seed)
+        tree = BinaryTree()
+        values = set()
+        for _ in range(300):
+            value = rnd.randrange(100)
+            if value in values and rnd.random() < 0.7:
+                tree.delete(value)
+                values.remove(value)
+            elif value not in values:
+                tree.insert(value)
+                values.add(value)
+            if rnd.random() < 0.2:
+                self.check(tree, values)
+        self.check(tree, values)
+        for value in rnd.sample(sorted(values), len(values)):
+            tree.delete(value)
+            values.remove(value)
+            self.check(tree, values)
+
+    def test_duplicate(self):
+        tree = BinaryTree.from_sorted([1, 2, 3])
+        with pytest.raises(ValueError):
+            tree.insert(2)
+
+    def test_degenerate(self):
+        # deeper than the recursion limit => every walk must be iterative
+        size = sys.getrecursionlimit() + 100
+        tree = BinaryTree()
+        for value in range(size):
+            tree.insert(value)
+        self.check(tree, range(size))
+        deepest = tree.find(size - 1)
+        assert deepest.depth == size - 1
+        assert size - 1 in tree and size not in tree
+
+        tree.delete(0)  # the root
+        assert deepest.depth == size - 2
+        for value in range(size - 1, size // 2, -1):
+            tree.delete(value)
+        self.check(tree, range(1, size // 2 + 1))
 
 
 if __name__ == "__main__":
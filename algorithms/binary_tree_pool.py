@@ -0,0 +1,502 @@
+# run this as:
+#   python3.9 -m algorithms.binary_tree_pool
+
+from __future__ import annotations
+
+import array
+import gc
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import pytest
+
+from algorithms.binary_tree import BalancedBinaryTree, BinaryTree
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = [int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5]
+        memory_report(sizes)
+        bench(sizes)
+        return
+    logging.getLogger().setLevel(logging.DEBUG)
+    pytest.main(sys.argv)
+
+
+T = TypeVar("T")
+
+# index 0 is a sentinel node: height 0, size 0 => no checks for missing children
+NIL = 0
+
+
+class PooledBinaryTree:
+    """
+    AVL tree with the `BalancedBinaryTree` API whose nodes are rows of
+    parallel arrays (struct of arrays) linked by integer indexes.
+
+    There is no object per node: a node costs two list slots (value and
+    payload) plus a few machine integers. `PooledNode` views are created
+    only for nodes handed out to the caller.
+    """
+
+    def __init__(self):
+        self.values: List[T] = [None]
+        self.payloads: List[Any] = [None]
+        self.lefts = array.array("q", [NIL])
+        self.rights = array.array("q", [NIL])
+        self.parents = array.array("q", [NIL])
+        self.heights = array.array("B", [0])
+        self.sizes = array.array("q", [0])
+        self.root = NIL
+
+    def new_node(self, value: T, payload: Any, parent: int) -> int:
+        self.values.append(value)
+        self.payloads.append(payload)
+        self.lefts.append(NIL)
+        self.rights.append(NIL)
+        self.parents.append(parent)
+        self.heights.append(1)
+        self.sizes.append(1)
+        return len(self.values) - 1
+
+    def add(self, value: T, payload: Any):
+        if self.root == NIL:
+            self.root = self.new_node(value, payload, NIL)
+            return
+
+        values = self.values
+        lefts = self.lefts
+        rights = self.rights
+        index = self.root
+
+        while True:
+            current = values[index]
+            if current == value:
+                # same value => overwrite payload
+                self.payloads[index] = payload
+                return
+            elif value < current:
+                child = lefts[index]
+                if child == NIL:
+                    lefts[index] = self.new_node(value, payload, index)
+                    break
+            else:
+                child = rights[index]
+                if child == NIL:
+                    rights[index] = self.new_node(value, payload, index)
+                    break
+            index = child
+
+        parents = self.parents
+        sizes = self.sizes
+        parent = index
+        while parent != NIL:
+            sizes[parent] += 1
+            parent = parents[parent]
+
+        self.rebalance(index)
+
+    def rebalance(self, index: int):
+        """Restore heights and balance from `index` up to the root"""
+        heights = self.heights
+        lefts = self.lefts
+        rights = self.rights
+
+        while index != NIL:
+            old_height = heights[index]
+            self.update(index)
+            balance = heights[lefts[index]] - heights[rights[index]]
+
+            if balance > 1:
+                # left subtree is too high
+                left = lefts[index]
+                if heights[lefts[left]] < heights[rights[left]]:
+                    self.rotate_left(left)
+                index = self.rotate_right(index)
+            elif balance < -1:
+                # right subtree is too high
+                right = rights[index]
+                if heights[rights[right]] < heights[lefts[right]]:
+                    self.rotate_right(right)
+                index = self.rotate_left(index)
+
+            if heights[index] == old_height:
+                # subtree height is the same => ancestors are balanced
+                return
+            index = self.parents[index]
+
+    def update(self, index: int):
+        """Recalculate height and size from the children"""
+        left = self.lefts[index]
+        right = self.rights[index]
+        self.heights[index] = max(self.heights[left], self.heights[right]) + 1
+        self.sizes[index] = self.sizes[left] + self.sizes[right] + 1
+
+    def rotate_left(self, index: int) -> int:
+        pivot = self.rights[index]
+        child = self.lefts[pivot]
+        self.rights[index] = child
+        if child != NIL:
+            self.parents[child] = index
+        self.lefts[pivot] = index
+        self.replace_child(index, pivot)
+        self.update(index)
+        self.update(pivot)
+        return pivot
+
+    def rotate_right(self, index: int) -> int:
+        pivot = self.lefts[index]
+        child = self.rights[pivot]
+        self.lefts[index] = child
+        if child != NIL:
+            self.parents[child] = index
+        self.rights[pivot] = index
+        self.replace_child(index, pivot)
+        self.update(index)
+        self.update(pivot)
+        return pivot
+
+    def replace_child(self, index: int, new_index: int):
+        """Put `new_index` in place of `index`, and `index` under `new_index`"""
+        parent = self.parents[index]
+        self.parents[new_index] = parent
+        self.parents[index] = new_index
+        if parent == NIL:
+            self.root = new_index
+        elif self.lefts[parent] == index:
+            self.lefts[parent] = new_index
+        else:
+            self.rights[parent] = new_index
+
+    def find_index(self, value: T) -> int:
+        values = self.values
+        index = self.root
+        while index != NIL:
+            current = values[index]
+            if current == value:
+                return index
+            elif value < current:
+                index = self.lefts[index]
+            else:
+                index = self.rights[index]
+        return NIL
+
+    def find(self, value: T) -> Optional[PooledNode]:
+        index = self.find_index(value)
+        if index == NIL:
+            return None
+        return PooledNode(self, index)
+
+    def iter_indexes(self) -> Iterator[Tuple[int, int]]:
+        """In-order (level, index) pairs"""
+        lefts = self.lefts
+        stack = []
+        index = self.root
+        level = 0
+        while stack or index != NIL:
+            while index != NIL:
+                stack.append((index, level))
+                index = lefts[index]
+                level += 1
+            index, level = stack.pop()
+            yield level, index
+            index = self.rights[index]
+            level += 1
+
+    def traverse(self) -> Iterable[Tuple[int, PooledNode]]:
+        for level, index in self.iter_indexes():
+            yield level, PooledNode(self, index)
+
+    def __iter__(self) -> Iterator[PooledNode]:
+        for _level, index in self.iter_indexes():
+            yield PooledNode(self, index)
+
+    def __reversed__(self) -> Iterator[PooledNode]:
+        rights = self.rights
+        stack = []
+        index = self.root
+        while stack or index != NIL:
+            while index != NIL:
+                stack.append(index)
+                index = rights[index]
+            index = stack.pop()
+            yield PooledNode(self, index)
+            index = self.lefts[index]
+
+    def iter_range(self, low: T, high: T) -> Iterator[PooledNode]:
+        """Nodes with `low <= value < high` in order"""
+        values = self.values
+        lefts = self.lefts
+        stack = []
+        index = self.root
+        while index != NIL:
+            if values[index] < low:
+                index = self.rights[index]
+            else:
+                stack.append(index)
+                index = lefts[index]
+
+        while stack:
+            index = stack.pop()
+            if not values[index] < high:
+                return
+            yield PooledNode(self, index)
+            index = self.rights[index]
+            while index != NIL:
+                stack.append(index)
+                index = lefts[index]
+
+    def __len__(self) -> int:
+        return self.sizes[self.root]
+
+    def iter_wide(self) -> Iterator[PooledNode]:
+        if self.root == NIL:
+            return
+        current_indexes = [self.root]
+        while current_indexes:
+            next_indexes = []
+            for index in current_indexes:
+                yield PooledNode(self, index)
+                if self.lefts[index] != NIL:
+                    next_indexes.append(self.lefts[index])
+                if self.rights[index] != NIL:
+                    next_indexes.append(self.rights[index])
+            current_indexes = next_indexes
+
+    def rank(self, value: T) -> int:
+        """Number of values less than `value`"""
+        values = self.values
+        sizes = self.sizes
+        index = self.root
+        rank = 0
+
+        while index != NIL:
+            if values[index] < value:
+                rank += 1 + sizes[self.lefts[index]]
+                index = self.rights[index]
+            else:
+                index = self.lefts[index]
+
+        return rank
+
+    def select(self, index: int) -> PooledNode:
+        """Node with the `index`-th smallest value"""
+        sizes = self.sizes
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        node = self.root
+        while True:
+            left_size = sizes[self.lefts[node]]
+            if index < left_size:
+                node = self.lefts[node]
+            elif index == left_size:
+                return PooledNode(self, node)
+            else:
+                index -= left_size + 1
+                node = self.rights[node]
+
+    def count_range(self, low: T, high: T) -> int:
+        """Number of values in `low <= value < high`"""
+        if self.root == NIL or not low < high:
+            return 0
+        return self.rank(high) - self.rank(low)
+
+    @property
+    def height(self) -> int:
+        return self.heights[self.root]
+
+
+class PooledNode:
+    """Read-only view of a `PooledBinaryTree` node (payload is writable)"""
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree: PooledBinaryTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    def __repr__(self):
+        return "PooledNode(value={!r}, payload={!r})".format(self.value, self.payload)
+
+    def __eq__(self, other):
+        if not isinstance(other, PooledNode):
+            return NotImplemented
+        return self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def get_node(self, index: int) -> Optional[PooledNode]:
+        return PooledNode(self.tree, index) if index != NIL else None
+
+    @property
+    def value(self) -> T:
+        return self.tree.values[self.index]
+
+    @property
+    def payload(self) -> Any:
+        return self.tree.payloads[self.index]
+
+    @payload.setter
+    def payload(self, payload: Any):
+        self.tree.payloads[self.index] = payload
+
+    @property
+    def left(self) -> Optional[PooledNode]:
+        return self.get_node(self.tree.lefts[self.index])
+
+    @property
+    def right(self) -> Optional[PooledNode]:
+        return self.get_node(self.tree.rights[self.index])
+
+    @property
+    def parent(self) -> Optional[PooledNode]:
+        return self.get_node(self.tree.parents[self.index])
+
+    @property
+    def height(self) -> int:
+        return self.tree.heights[self.index]
+
+    @property
+    def size(self) -> int:
+        return self.tree.sizes[self.index]
+
+
+TREES = {
+    "BinaryTree": BinaryTree,
+    "BalancedBinaryTree": BalancedBinaryTree,
+    "PooledBinaryTree": PooledBinaryTree,
+}
+
+
+def measure_memory(make_tree: Callable[[], Any], values: List[T]) -> float:
+    """Bytes allocated per node (values themselves are not counted)"""
+    gc.collect()
+    tracemalloc.start()
+    tree = make_tree()
+    for value in values:
+        tree.add(value=value, payload=None)
+    allocated, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(tree) == len(values)
+    return allocated / len(values)
+
+
+def memory_report(sizes: Iterable[int]):
+    print("{:>10} {:>20} {:>14}".format("size", "tree", "bytes/node"))
+    for size in sizes:
+        values = random.sample(range(size), size)
+        for name, make_tree in TREES.items():
+            per_node = measure_memory(make_tree, values)
+            print("{:>10} {:>20} {:>14.1f}".format(size, name, per_node))
+
+
+def bench(sizes: Iterable[int]):
+    print("{:>10} {:>20} {:>14} {:>14}".format("size", "tree", "insert/s", "lookup/s"))
+    for size in sizes:
+        values = random.sample(range(size), size)
+        for name, make_tree in TREES.items():
+            tree = make_tree()
+            start = time.perf_counter()
+            for value in values:
+                tree.add(value=value, payload=None)
+            inserted = time.perf_counter()
+            for value in values:
+                tree.find(value)
+            found = time.perf_counter()
+            print(
+                "{:>10} {:>20} {:>14.0f} {:>14.0f}".format(
+                    size, name, size / (inserted - start), size / (found - inserted)
+                )
+            )
+
+
+class TestPooledBinaryTree:
+    @pytest.mark.parametrize(
+        "values",
+        [
+            list(range(1000)),
+            list(range(1000, 0, -1)),
+            random.Random(1).sample(range(1000), 1000),
+            [50, 30, 40, 35, 38, 37, 70, 60, 65, 62, 63],
+        ],
+    )
+    def test_same_as_balanced(self, values):
+        tree = PooledBinaryTree()
+        expected = BalancedBinaryTree()
+        for value in values:
+            tree.add(value=value, payload=str(value))
+            expected.add(value=value, payload=str(value))
+
+        assert len(tree) == len(expected) == len(values)
+        assert tree.height == expected.height
+
+        def dump(nodes):
+            return [(node.value, node.payload, node.size) for node in nodes]
+
+        assert dump(tree) == dump(expected)
+        assert dump(tree.iter_wide()) == dump(expected.iter_wide())
+        assert dump(reversed(tree)) == dump(reversed(expected))
+        ordered = sorted(values)
+        low, high = ordered[len(values) // 4], ordered[len(values) * 3 // 4]
+        assert dump(tree.iter_range(low, high)) == dump(expected.iter_range(low, high))
+        assert [(level, node.value) for level, node in tree.traverse()] == [
+            (level, node.value) for level, node in expected.traverse()
+        ]
+
+        for node in tree:
+            assert node.height == 1 + max(
+                node.left.height if node.left else 0,
+                node.right.height if node.right else 0,
+            )
+            assert node.parent is None or node in (node.parent.left, node.parent.right)
+
+        ordered = sorted(values)
+        for index, value in enumerate(ordered):
+            assert tree.find(value).payload == str(value)
+            assert tree.select(index).value == value
+            assert tree.rank(value) == index
+        assert tree.count_range(ordered[0], ordered[-1]) == len(values) - 1
+
+    def test_overwrite(self):
+        tree = PooledBinaryTree()
+        for value in range(10):
+            tree.add(value=value, payload="a")
+        tree.find(3).payload = "c"
+        assert tree.find(3).payload == "c"
+        for value in range(10):
+            tree.add(value=value, payload="b")
+        assert len(tree) == 10
+        assert {node.payload for node in tree} == {"b"}
+
+    def test_empty(self):
+        tree = PooledBinaryTree()
+        assert len(tree) == 0
+        assert list(tree) == []
+        assert list(tree.traverse()) == []
+        assert list(tree.iter_wide()) == []
+        assert list(reversed(tree)) == []
+        assert list(tree.iter_range(0, 1)) == []
+        assert tree.find(1) is None
+        assert tree.height == 0
+        assert tree.rank(1) == 0
+        assert tree.count_range(0, 1) == 0
+        with pytest.raises(IndexError):
+            tree.select(0)
+
+    def test_memory(self):
+        values = list(range(1000))
+        pooled = measure_memory(PooledBinaryTree, values)
+        balanced = measure_memory(BalancedBinaryTree, values)
+        assert pooled * 2 < balanced
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# run this as:
+#   python3.9 -m algorithms.binary_tree_snapshot
+
+from __future__ import annotations
+
+import logging
+import mmap
+import pickle
+import random
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+    overload,
+)
+
+import pytest
+
+from algorithms.binary_search import get_index_binary
+from algorithms.binary_tree import BalancedBinaryTree, BinaryTree
+from algorithms.binary_tree_pool import PooledBinaryTree
+
+MAGIC = b"BTS1"
+HEADER = struct.Struct("<4sQQ")  # magic, node count, position of the offsets
+OFFSET = struct.Struct("<Q")
+VALUE_LENGTH = struct.Struct("<I")
+
+T = TypeVar("T")
+
+Dumps = Callable[[Any], bytes]
+Loads = Callable[[bytes], Any]
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = [int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5]
+        bench(sizes)
+        return
+    logging.getLogger().setLevel(logging.DEBUG)
+    pytest.main(sys.argv)
+
+
+def dumps(obj: Any) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def dump_tree(tree: Iterable, path: Union[str, Path], dumps: Dumps = dumps) -> int:
+    """
+    Write nodes of `tree` in order as records of encoded value and payload.
+
+    File layout: header, records, then the offset of every record (and of
+    the end of the last one), so records can be read at random from mmap.
+    Returns the number of written nodes.
+    """
+    offsets = []
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, 0, 0))
+        position = HEADER.size
+        for node in tree:
+            offsets.append(position)
+            value = dumps(node.value)
+            payload = dumps(node.payload)
+            file.write(VALUE_LENGTH.pack(len(value)))
+            file.write(value)
+            file.write(payload)
+            position += VALUE_LENGTH.size + len(value) + len(payload)
+        offsets.append(position)
+
+        for offset in offsets:
+            file.write(OFFSET.pack(offset))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, len(offsets) - 1, position))
+
+    return len(offsets) - 1
+
+
+def load_tree(
+    path: Union[str, Path],
+    tree_class: Type[BinaryTree] = BalancedBinaryTree,
+    loads: Loads = pickle.loads,
+) -> BinaryTree:
+    """
+    Rebuild a balanced tree from a snapshot in O(n) without comparing values:
+    records are already in order, so they are placed by `BinaryTree.build`.
+    """
+    with SnapshotTree(path, loads=loads) as snapshot:
+        tree = tree_class()
+        tree.node = tree.build(snapshot.iter_items(), len(snapshot), parent=None)
+    return tree
+
+
+class SnapshotNode(NamedTuple):
+    value: T
+    payload: Any
+
+
+class SnapshotTree(Sequence[SnapshotNode]):
+    """
+    Read-only tree served straight from a memory-mapped snapshot: a sequence
+    of nodes in order. Only records touched by a lookup are decoded.
+
+    Records are decoded by `loads`, `pickle.loads` by default: never open
+    untrusted snapshots with it, unpickling can run arbitrary code.
+    """
+
+    def __init__(self, path: Union[str, Path], loads: Loads = pickle.loads):
+        self.loads = loads
+        self.file = open(path, "rb")
+        try:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.file.close()
+            raise ValueError("Not a tree snapshot: {}".format(path))
+
+        if len(self.mmap) < HEADER.size:
+            self.close()
+            raise ValueError("Not a tree snapshot: {}".format(path))
+        magic, self.length, self.offsets_position = HEADER.unpack_from(self.mmap)
+        offsets_end = self.offsets_position + (self.length + 1) * OFFSET.size
+        if magic != MAGIC or len(self.mmap) < offsets_end:
+            self.close()
+            raise ValueError("Not a tree snapshot: {}".format(path))
+
+        self.values = SnapshotValues(self)
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self) -> SnapshotTree:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def get_offset(self, index: int) -> int:
+        return OFFSET.unpack_from(
+            self.mmap, self.offsets_position + index * OFFSET.size
+        )[0]
+
+    def get_value(self, index: int) -> T:
+        start = self.get_offset(index) + VALUE_LENGTH.size
+        (length,) = VALUE_LENGTH.unpack_from(self.mmap, start - VALUE_LENGTH.size)
+        return self.loads(self.mmap[start : start + length])
+
+    @overload
+    def __getitem__(self, index: int) -> SnapshotNode:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[SnapshotNode]:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+
+        start = self.get_offset(index)
+        end = self.get_offset(index + 1)
+        (length,) = VALUE_LENGTH.unpack_from(self.mmap, start)
+        start += VALUE_LENGTH.size
+        value = self.loads(self.mmap[start : start + length])
+        payload = self.loads(self.mmap[start + length : end])
+        return SnapshotNode(value=value, payload=payload)
+
+    def iter_items(self) -> Iterator[SnapshotNode]:
+        for index in range(self.length):
+            yield self[index]
+
+    def find(self, value: T) -> Optional[SnapshotNode]:
+        index = get_index_binary(self.values, value)
+        if index is None:
+            return None
+        return self[index]
+
+
+class SnapshotValues(Sequence[T]):
+    """Values of a `SnapshotTree`, payloads are not decoded"""
+
+    def __init__(self, tree: SnapshotTree):
+        self.tree = tree
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def __getitem__(self, index: int) -> T:
+        if not 0 <= index < len(self.tree):
+            raise IndexError(index)
+        return self.tree.get_value(index)
+
+
+def bench(sizes: Iterable[int]):
+    print(
+        "{:>10} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+            "size", "add, s", "dump, s", "load, s", "open, s", "file, MB"
+        )
+    )
+    for size in sizes:
+        values = random.sample(range(size), size)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "tree.bts"
+
+            start = time.perf_counter()
+            tree = BalancedBinaryTree()
+            for value in values:
+                tree.add(value=value, payload=str(value))
+            added = time.perf_counter()
+            dump_tree(tree, path)
+            dumped = time.perf_counter()
+            load_tree(path)
+            loaded = time.perf_counter()
+            with SnapshotTree(path) as snapshot:
+                snapshot.find(values[0])
+            opened = time.perf_counter()
+
+            print(
+                "{:>10} {:>12.3f} {:>12.3f} {:>12.3f} {:>12.6f} {:>12.1f}".format(
+                    size,
+                    added - start,
+                    dumped - added,
+                    loaded - dumped,
+                    opened - loaded,
+                    path.stat().st_size / 2 ** 20,
+                )
+            )
+
+
+class TestSnapshot:
+    @pytest.fixture
+    def tree(self):
+        tree = BinaryTree()
+        for value in random.Random(1).sample(range(1000), 500):
+            tree.add(value=value, payload=("payload", value))
+        return tree
+
+    @pytest.fixture
+    def path(self, tree, tmp_path):
+        path = tmp_path / "tree.bts"
+        assert dump_tree(tree, path) == 500
+        return path
+
+    @pytest.mark.parametrize("tree_class", [BinaryTree, BalancedBinaryTree])
+    def test_load(self, tree, path, tree_class):
+        loaded = load_tree(path, tree_class=tree_class)
+        assert type(loaded) is tree_class
+        assert [(node.value, node.payload) for node in loaded] == [
+            (node.value, node.payload) for node in tree
+        ]
+        assert len(loaded) == 500
+        assert max(level for level, _node in loaded.traverse()) < 10
+        loaded.add(value=1000, payload=None)
+        assert len(loaded) == 501
+
+    def test_snapshot_tree(self, tree, path):
+        with SnapshotTree(path) as snapshot:
+            assert len(snapshot) == 500
+            assert list(snapshot) == [(node.value, node.payload) for node in tree]
+            for value in range(-1, 1001):
+                node = tree.find(value)
+                found = snapshot.find(value)
+                if node is None:
+                    assert found is None
+                else:
+                    assert found == (value, ("payload", value))
+            assert snapshot[-1] == snapshot[499]
+            assert snapshot[10:13] == [snapshot[10], snapshot[11], snapshot[12]]
+            with pytest.raises(IndexError):
+                snapshot[500]
+
+    @pytest.mark.parametrize("size", [0, 4, HEADER.size - 1, HEADER.size, -1])
+    def test_truncated(self, path, size):
+        content = path.read_bytes()
+        path.write_bytes(content[:size])
+        with pytest.raises(ValueError):
+            SnapshotTree(path)
+
+    def test_pooled(self, tmp_path):
+        tree = PooledBinaryTree()
+        for value in range(100):
+            tree.add(value=str(value), payload=value)
+        path = tmp_path / "tree.bts"
+        dump_tree(tree, path)
+        with SnapshotTree(path) as snapshot:
+            assert snapshot.find("42").payload == 42
+
+    def test_codec(self, tmp_path):
+        tree = BinaryTree.from_sorted((value, value * 2) for value in range(10))
+        path = tmp_path / "tree.bts"
+        dump_tree(tree, path, dumps=lambda obj: str(obj).encode())
+        loaded = load_tree(path, loads=lambda data: int(data.decode()))
+        assert [(node.value, node.payload) for node in loaded] == [
+            (value, value * 2) for value in range(10)
+        ]
+
+    def test_empty(self, tmp_path):
+        path = tmp_path / "tree.bts"
+        assert dump_tree(BinaryTree(), path) == 0
+        assert len(load_tree(path)) == 0
+        with SnapshotTree(path) as snapshot:
+            assert len(snapshot) == 0
+            assert snapshot.find(1) is None
+
+    def test_not_snapshot(self, tmp_path):
+        path = tmp_path / "tree.bts"
+        path.write_bytes(b"\0" * HEADER.size)
+        with pytest.raises(ValueError):
+            SnapshotTree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import heapq
+import itertools
+import operator
+import random
 import sys
-from typing import Iterable, Iterator, List, TypeVar
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 import pytest
 
@@ -13,13 +18,19 @@ class MaxBinaryHeap:
     items: List[T]
 
     def __init__(self, *args: T):
-        self.items = []
-        for value in args:
-            self.append(value)
+        self.items = list(args)
+        self.heapify()
+
+    @classmethod
+    def from_iterable(cls, values: Iterable[T]) -> MaxBinaryHeap:
+        heap = cls()
+        heap.items = list(values)
+        heap.heapify()
+        return heap
 
     @staticmethod
     def get_parent_index(index: int) -> int:
-        return index // 2
+        return (index - 1) // 2
 
     @staticmethod
     def get_left_child_index(index: int) -> int:
@@ -29,28 +40,61 @@ class MaxBinaryHeap:
     def get_right_child_index(index: int) -> int:
         return 2 * index + 2
 
+    def heapify(self):
+        """Bottom-up heap construction: O(n)"""
+        items = self.items
+        length = len(items)
+
+        for index in range(length // 2 - 1, -1, -1):
+            value = items[index]
+            child_index = 2 * index + 1
+            while child_index < length:
+                child_value = items[child_index]
+                right_child_index = child_index + 1
+                if right_child_index < length:
+                    right_child_value = items[right_child_index]
+                    if child_value < right_child_value:
+                        child_index = right_child_index
+                        child_value = right_child_value
+                    elif child_value == right_child_value:
+                        raise ValueError("Duplicate value: {!r}".format(child_value))
+                if value == child_value:
+                    raise ValueError("Duplicate value: {!r}".format(value))
+                elif child_value < value:
+                    break
+                items[index] = child_value
+                index = child_index
+                child_index = 2 * index + 1
+            items[index] = value
+
     def get_max(self) -> T:
         if not self.items:
             raise ValueError
         return self.items[0]
 
     def append(self, value: T):
-        self.items.append(value)
-        child_index = len(self.items) - 1
-        while child_index:
-            parent_index = self.get_parent_index(child_index)
-            parent_value = self.items[parent_index]
+        items = self.items
+        child_index = len(items)
+
+        # find the place first => heap is untouched if value is a duplicate
+        index = child_index
+        while index:
+            parent_index = (index - 1) // 2
+            parent_value = items[parent_index]
             if value == parent_value:
-                raise ValueError
+                raise ValueError("Duplicate value: {!r}".format(value))
             elif value < parent_value:
                 # all good -> nothing to do
-                return
-            # parent_value < value -> swap them
-            self.items[child_index], self.items[parent_index] = (
-                self.items[parent_index],
-                self.items[child_index],
-            )
+                break
+            index = parent_index
+
+        # move parents down into the hole
+        items.append(value)
+        while child_index > index:
+            parent_index = (child_index - 1) // 2
+            items[child_index] = items[parent_index]
             child_index = parent_index
+        items[index] = value
 
     def pop_max(self) -> T:
         if len(self.items) == 1:
@@ -63,33 +107,9 @@ class MaxBinaryHeap:
         return max_value
 
     def balance_index(self, index: int, value: T):
-        max_index = len(self.items) - 1
-
-        while True:
-            left_child_index = self.get_left_child_index(index)
-            right_child_index = self.get_right_child_index(index)
-
-            children_indexes = [left_child_index, right_child_index]
-            children_indexes = [idx for idx in children_indexes if idx <= max_index]
-            children_values = [self.items[i] for i in children_indexes]
-
-            if all(children_value < value for children_value in children_values):
-                break
-
-            if len(children_indexes) == 1:
-                # parent has only one child and it is bigger than it is
-                child_index = children_indexes[0]
-            else:
-                if children_values[0] < children_values[1]:
-                    child_index = children_indexes[1]
-                else:
-                    child_index = children_indexes[0]
-
-            self.items[index], self.items[child_index] = (
-                self.items[child_index],
-                self.items[index],
-            )
-            index = child_index
+        """Sift `value` down from `index`, moving bigger children into the hole"""
+        self.items[index] = value
+        sift_down_max(self.items, index, len(self.items))
 
     def pop_all(self) -> Iterator[T]:
         while self.items:
@@ -110,6 +130,311 @@ class MaxBinaryHeap:
         return max_value
 
 
+def sift_down_max(
+    items: List[T],
+    index: int,
+    length: int,
+    offset: int = 0,
+    values: Optional[List[Any]] = None,
+):
+    """
+    Sift `items[offset + index]` down the max-heap of `length` items that
+    starts at `offset`, moving bigger children into the hole. `values` (if
+    any) get the same moves, so a slice can be heap sorted with a parallel
+    list.
+
+    >>> items = [1, 5, 4, 3, 2]
+    >>> sift_down_max(items, 0, 5)
+    >>> items
+    [5, 3, 4, 1, 2]
+    """
+    item = items[offset + index]
+    moved = None if values is None else values[offset + index]
+    child = 2 * index + 1
+    while child < length:
+        if child + 1 < length and items[offset + child] < items[offset + child + 1]:
+            child += 1
+        if not item < items[offset + child]:
+            break
+        items[offset + index] = items[offset + child]
+        if values is not None:
+            values[offset + index] = values[offset + child]
+        index = child
+        child = 2 * index + 1
+    items[offset + index] = item
+    if values is not None:
+        values[offset + index] = moved
+
+
+class ReversedKey:
+    """Key wrapper with the opposite order, turns a min-heap into a max-heap"""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: Any):
+        self.key = key
+
+    def __eq__(self, other: ReversedKey) -> bool:
+        return self.key == other.key
+
+    def __lt__(self, other: ReversedKey) -> bool:
+        return other.key < self.key
+
+
+class Heap:
+    """
+    D-ary heap of items ordered by `key(item)`: the smallest first, or the
+    biggest first with `reverse=True`. Keys are computed once and kept next
+    to the items together with an insertion number, so items with equal keys
+    come out in insertion order and are never compared themselves.
+
+    >>> heap = Heap(["bb", "a", "ccc", "dd"], key=len, reverse=True, arity=4)
+    >>> heap.push("ee")
+    >>> list(heap.pop_all())
+    ['ccc', 'bb', 'dd', 'ee', 'a']
+    """
+
+    entries: List[Tuple[Any, int, T]]
+
+    def __init__(
+        self,
+        items: Iterable[T] = (),
+        key: Optional[Callable[[T], Any]] = None,
+        reverse: bool = False,
+        arity: int = 2,
+    ):
+        if arity < 2:
+            raise ValueError("Arity must be at least 2")
+        self.key = key
+        self.reverse = reverse
+        self.arity = arity
+        self.counter = itertools.count()
+        self.entries = [self.make_entry(item) for item in items]
+        self.heapify()
+
+    def make_entry(self, item: T) -> Tuple[Any, int, T]:
+        key = item if self.key is None else self.key(item)
+        if self.reverse:
+            key = ReversedKey(key)
+        return key, next(self.counter), item
+
+    def heapify(self):
+        """Bottom-up heap construction: O(n)"""
+        entries = self.entries
+        for index in range((len(entries) - 2) // self.arity, -1, -1):
+            self.sift_down(index, entries[index])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __bool__(self) -> bool:
+        return bool(self.entries)
+
+    def peek(self) -> T:
+        if not self.entries:
+            raise ValueError("Heap is empty")
+        return self.entries[0][2]
+
+    def push(self, item: T):
+        entry = self.make_entry(item)
+        self.entries.append(entry)
+        self.sift_up(len(self.entries) - 1, entry)
+
+    def pop(self) -> T:
+        entries = self.entries
+        if not entries:
+            raise ValueError("Heap is empty")
+
+        last = entries.pop()
+        if not entries:
+            return last[2]
+
+        top = entries[0]
+        self.sift_down(0, last)
+        return top[2]
+
+    def push_pop(self, item: T) -> T:
+        """Push `item`, then pop the top item (faster than push + pop)"""
+        entry = self.make_entry(item)
+        entries = self.entries
+        if not entries or entry < entries[0]:
+            return item
+
+        top = entries[0]
+        self.sift_down(0, entry)
+        return top[2]
+
+    def pop_all(self) -> Iterator[T]:
+        while self.entries:
+            yield self.pop()
+
+    def sift_up(self, index: int, entry: Tuple[Any, int, T]):
+        entries = self.entries
+        arity = self.arity
+
+        while index:
+            parent_index = (index - 1) // arity
+            parent_entry = entries[parent_index]
+            if not entry < parent_entry:
+                break
+            entries[index] = parent_entry
+            index = parent_index
+
+        entries[index] = entry
+
+    def sift_down(self, index: int, entry: Tuple[Any, int, T]):
+        entries = self.entries
+        arity = self.arity
+        length = len(entries)
+        child_index = arity * index + 1
+
+        while child_index < length:
+            # find the smallest child
+            best_index = child_index
+            best_entry = entries[child_index]
+            for other_index in range(child_index + 1, min(child_index + arity, length)):
+                other_entry = entries[other_index]
+                if other_entry < best_entry:
+                    best_index = other_index
+                    best_entry = other_entry
+
+            if not best_entry < entry:
+                break
+            entries[index] = best_entry
+            index = best_index
+            child_index = arity * index + 1
+
+        entries[index] = entry
+
+
+class KSortedSorter:
+    """
+    Streaming sorter for nearly sorted input where every item is at most `k`
+    positions away from its place: O(n log k) time and O(k) memory.
+
+    Items that arrive too late to be put in place are yielded as soon as
+    they come and counted in `violations`.
+
+    >>> sorter = KSortedSorter(k=2)
+    >>> list(sorter.sort([2, 1, 3, 5, 4, 0, 6]))
+    [1, 2, 3, 0, 4, 5, 6]
+    >>> sorter.count, sorter.violations
+    (7, 1)
+    """
+
+    def __init__(
+        self,
+        k: int,
+        key: Optional[Callable[[T], Any]] = None,
+        reverse: bool = False,
+    ):
+        if k < 0:
+            raise ValueError("k must not be negative")
+        self.k = k
+        self.key = key
+        self.reverse = reverse
+        self.count = 0
+        self.violations = 0
+
+    def sort(self, items: Iterable[T]) -> Iterator[T]:
+        key = self.key
+        reverse = self.reverse
+        # (key, item) pairs => the key is calculated once per item
+        heap = Heap(key=operator.itemgetter(0), reverse=reverse)
+        missing = last_key = object()
+
+        for item in items:
+            self.count += 1
+            pair = (item if key is None else key(item), item)
+            if len(heap) < self.k:
+                heap.push(pair)
+                continue
+
+            item_key, item = heap.push_pop(pair)
+            if last_key is not missing and (
+                last_key < item_key if reverse else item_key < last_key
+            ):
+                # arrived more than k positions late
+                self.violations += 1
+            else:
+                last_key = item_key
+            yield item
+
+        for _key, item in heap.pop_all():
+            yield item
+
+
+def bench(sizes: Iterable[int]):
+    print(
+        "{:>10} {:>8} {:>14} {:>14} {:>14}".format(
+            "size", "heap", "heapify, s", "push/s", "pop/s"
+        )
+    )
+    for size in sizes:
+        values = random.sample(range(size), size)
+
+        start = time.perf_counter()
+        MaxBinaryHeap.from_iterable(values)
+        heapified = time.perf_counter()
+        heap = MaxBinaryHeap()
+        for value in values:
+            heap.append(value)
+        pushed = time.perf_counter()
+        for _ in range(size):
+            heap.pop_max()
+        popped = time.perf_counter()
+        print(
+            "{:>10} {:>8} {:>14.3f} {:>14.0f} {:>14.0f}".format(
+                size,
+                "binary",
+                heapified - start,
+                size / (pushed - heapified),
+                size / (popped - pushed),
+            )
+        )
+
+        for arity in (2, 4, 8):
+            start = time.perf_counter()
+            heap = Heap(values, arity=arity)
+            heapified = time.perf_counter()
+            heap = Heap(arity=arity)
+            for value in values:
+                heap.push(value)
+            pushed = time.perf_counter()
+            for _ in range(size):
+                heap.pop()
+            popped = time.perf_counter()
+            print(
+                "{:>10} {:>8} {:>14.3f} {:>14.0f} {:>14.0f}".format(
+                    size,
+                    "{}-ary".format(arity),
+                    heapified - start,
+                    size / (pushed - heapified),
+                    size / (popped - pushed),
+                )
+            )
+
+        start = time.perf_counter()
+        heapq.heapify(list(values))
+        heapified = time.perf_counter()
+        items = []
+        for value in values:
+            heapq.heappush(items, value)
+        pushed = time.perf_counter()
+        for _ in range(size):
+            heapq.heappop(items)
+        popped = time.perf_counter()
+        print(
+            "{:>10} {:>8} {:>14.3f} {:>14.0f} {:>14.0f}".format(
+                size,
+                "heapq",
+                heapified - start,
+                size / (pushed - heapified),
+                size / (popped - pushed),
+            )
+        )
+
+
 class Test:
     random_items = [0, 1, 3, 2, 5, 6, 4, 8, 7, 9]
 
@@ -161,6 +486,42 @@ class Test:
         result = list(heap.pop_all())
         assert result == sorted(items, reverse=True)
 
+    @pytest.mark.parametrize("seed", range(10))
+    def test_heapify(self, seed):
+        items = random.Random(seed).sample(range(1000), 200)
+        heap = MaxBinaryHeap(*items)
+        for index in range(1, len(items)):
+            parent_index = heap.get_parent_index(index)
+            assert heap.items[index] < heap.items[parent_index]
+        assert list(heap.pop_all()) == sorted(items, reverse=True)
+
+    def test_from_iterable(self):
+        heap = MaxBinaryHeap.from_iterable(value for value in self.random_items)
+        assert list(heap.pop_all()) == sorted(self.random_items, reverse=True)
+
+    def test_parent_index(self):
+        for index in range(1, 100):
+            parent_index = MaxBinaryHeap.get_parent_index(index)
+            assert index in (
+                MaxBinaryHeap.get_left_child_index(parent_index),
+                MaxBinaryHeap.get_right_child_index(parent_index),
+            )
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_append(self, seed):
+        items = random.Random(seed).sample(range(1000), 200)
+        heap = MaxBinaryHeap()
+        for value in items:
+            heap.append(value)
+            assert heap.get_max() == max(heap.items)
+        assert list(heap.pop_all()) == sorted(items, reverse=True)
+
+    def test_append_dupe(self):
+        heap = MaxBinaryHeap(5, 3, 4)
+        with pytest.raises(ValueError):
+            heap.append(5)
+        assert heap.items == [5, 3, 4]
+
     @pytest.mark.parametrize("max_value", range(2, 10))
     def test_insert_pop_down_up(self, max_value):
         """Algorithm for sorting nearly-sorted array (within k elements)"""
@@ -182,5 +543,122 @@ class Test:
         assert result == list(range(10 * max_value - 1, -1, -1))
 
 
+class TestHeap:
+    items = [(3, "a"), (1, "b"), (3, "c"), (2, "d"), (1, "e"), (3, "f"), (0, "g")]
+
+    @pytest.mark.parametrize("arity", [2, 3, 4, 8])
+    @pytest.mark.parametrize("reverse", [False, True])
+    @pytest.mark.parametrize("seed", range(5))
+    def test_sorted(self, arity, reverse, seed):
+        rnd = random.Random(seed)
+        items = [(rnd.randrange(20), index) for index in range(300)]
+
+        def key(item):
+            return item[0]
+
+        heap = Heap(items[:100], key=key, reverse=reverse, arity=arity)
+        for item in items[100:]:
+            heap.push(item)
+        assert len(heap) == 300
+        assert list(heap.pop_all()) == sorted(items, key=key, reverse=reverse)
+        assert not heap
+
+    @pytest.mark.parametrize("reverse", [False, True])
+    def test_stable(self, reverse):
+        heap = Heap(key=lambda item: item[0], reverse=reverse)
+        for item in self.items:
+            heap.push(item)
+        expected = sorted(self.items, key=lambda item: item[0], reverse=reverse)
+        assert list(heap.pop_all()) == expected
+
+    def test_key_once(self):
+        calls = []
+
+        def key(item):
+            calls.append(item)
+            return -item
+
+        heap = Heap(range(100), key=key, arity=4)
+        assert list(heap.pop_all()) == list(range(99, -1, -1))
+        assert sorted(calls) == list(range(100))
+
+    def test_not_comparable(self):
+        heap = Heap([{"priority": 2}, {"priority": 1}], key=lambda x: x["priority"])
+        heap.push({"priority": 1})
+        assert [item["priority"] for item in heap.pop_all()] == [1, 1, 2]
+
+    def test_push_pop(self):
+        heap = Heap([5, 1, 3])
+        assert heap.push_pop(4) == 1
+        assert heap.push_pop(0) == 0
+        assert heap.peek() == 3
+        assert list(heap.pop_all()) == [3, 4, 5]
+
+    def test_push_pop_reverse(self):
+        heap = Heap([5, 1, 3], reverse=True)
+        assert heap.push_pop(4) == 5
+        assert heap.push_pop(6) == 6
+        assert heap.peek() == 4
+        assert list(heap.pop_all()) == [4, 3, 1]
+
+    def test_empty(self):
+        heap = Heap()
+        with pytest.raises(ValueError):
+            heap.pop()
+        with pytest.raises(ValueError):
+            heap.peek()
+        assert heap.push_pop(1) == 1
+        with pytest.raises(ValueError):
+            Heap(arity=1)
+
+
+class TestKSortedSorter:
+    @staticmethod
+    def shuffle_k(values: List[T], k: int, seed: int) -> List[T]:
+        """Move every value at most `k` positions away"""
+        rnd = random.Random(seed)
+        positions = [index + rnd.uniform(0, k) for index in range(len(values))]
+        return [value for _position, value in sorted(zip(positions, values))]
+
+    @pytest.mark.parametrize("k", [0, 1, 2, 5, 20])
+    @pytest.mark.parametrize("seed", range(5))
+    def test_sort(self, k, seed):
+        values = sorted(random.Random(seed).choices(range(100), k=500))
+        items = self.shuffle_k(values, k, seed)
+        sorter = KSortedSorter(k=k)
+        assert list(sorter.sort(iter(items))) == values
+        assert sorter.count == 500
+        assert sorter.violations == 0
+
+    @pytest.mark.parametrize("max_value", range(2, 10))
+    def test_insert_pop_down_up(self, max_value):
+        values = []
+        for i in range(9, -1, -1):
+            values.extend(range(i * max_value, (i + 1) * max_value))
+        sorter = KSortedSorter(k=max_value, reverse=True)
+        assert list(sorter.sort(values)) == list(range(10 * max_value - 1, -1, -1))
+        assert sorter.violations == 0
+
+    def test_key(self):
+        items = [(1, "a"), (0, "b"), (1, "c"), (3, "d"), (2, "e"), (2, "f")]
+        sorter = KSortedSorter(k=1, key=lambda item: item[0])
+        assert list(sorter.sort(items)) == sorted(items, key=lambda item: item[0])
+
+    def test_violations(self):
+        items = list(range(1, 100)) + [0] + list(range(100, 110)) + [50]
+        sorter = KSortedSorter(k=3)
+        result = list(sorter.sort(items))
+        assert sorted(result) == sorted(items)
+        assert sorter.violations == 2
+        assert sorter.count == len(items)
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            KSortedSorter(k=-1)
+
+
 if __name__ == "__main__":
-    pytest.main(sys.argv)
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench([int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5])
+    else:
+        pytest.main(sys.argv)
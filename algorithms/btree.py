@@ -0,0 +1,554 @@
+# run this as:
+#   python3.9 -m algorithms.btree
+
+from __future__ import annotations
+
+import bisect
+import gc
+import logging
+import pickle
+import random
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import pytest
+
+from algorithms.binary_tree import BalancedBinaryTree, BinaryTree
+
+T = TypeVar("T")
+
+NIL = -1  # no next leaf
+PAGE_HEADER = struct.Struct("<I")  # length of the encoded leaf
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = [int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5]
+        bench(sizes)
+        return
+    logging.getLogger().setLevel(logging.DEBUG)
+    pytest.main(sys.argv)
+
+
+class Entry(NamedTuple):
+    value: T
+    payload: Any
+
+
+class Leaf:
+    __slots__ = ("values", "payloads", "next")
+
+    def __init__(self, values: List[T], payloads: List[Any], next: int = NIL):
+        self.values = values
+        self.payloads = payloads
+        self.next = next
+
+
+class Inner:
+    """`keys[i]` is the smallest value of `children[i + 1]`"""
+
+    __slots__ = ("keys", "children")
+
+    def __init__(self, keys: List[T], children: List[Union[Inner, int]]):
+        self.keys = keys
+        self.children = children  # inner nodes or page ids of leaves
+
+
+class MemoryPages:
+    """Leaves kept in a list, page id is the index"""
+
+    def __init__(self):
+        self.pages: List[Leaf] = []
+        self.hits = self.misses = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.pages)
+
+    def new(self, leaf: Leaf) -> int:
+        self.pages.append(leaf)
+        return len(self.pages) - 1
+
+    def get(self, page_id: int) -> Leaf:
+        self.hits += 1
+        return self.pages[page_id]
+
+    def put(self, page_id: int, leaf: Leaf):
+        self.pages[page_id] = leaf
+
+    def check(self, leaf: Leaf):
+        pass
+
+    def close(self):
+        pass
+
+
+class FilePages:
+    """
+    Leaves stored in fixed-size pages of a file, with an LRU cache of
+    decoded leaves. Changed leaves are encoded by `put` (so a leaf that does
+    not fit into a page fails right there) and written back when they are
+    evicted or on `flush`.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        page_size: int = 4096,
+        cache_size: int = 64,
+        dumps: Callable[[Any], bytes] = pickle.dumps,
+        loads: Callable[[bytes], Any] = pickle.loads,
+    ):
+        if cache_size < 2:
+            raise ValueError("Cache must hold at least 2 pages for a split")
+        self.file = open(path, "w+b")
+        self.page_size = page_size
+        self.cache_size = cache_size
+        self.dumps = dumps
+        self.loads = loads
+        self.cache: OrderedDict[int, Leaf] = OrderedDict()
+        self.dirty: Dict[int, bytes] = {}  # encoded changed leaves
+        self.count = 0
+        self.hits = self.misses = 0
+
+    def new(self, leaf: Leaf) -> int:
+        page_id = self.count
+        self.put(page_id, leaf)
+        self.count += 1
+        return page_id
+
+    def get(self, page_id: int) -> Leaf:
+        leaf = self.cache.get(page_id)
+        if leaf is not None:
+            self.hits += 1
+            self.cache.move_to_end(page_id)
+            return leaf
+
+        self.misses += 1
+        self.file.seek(page_id * self.page_size)
+        page = self.file.read(self.page_size)
+        (length,) = PAGE_HEADER.unpack_from(page)
+        start = PAGE_HEADER.size
+        values, payloads, next_id = self.loads(page[start : start + length])
+        leaf = Leaf(values, payloads, next_id)
+        self.cache[page_id] = leaf
+        self.evict()
+        return leaf
+
+    def put(self, page_id: int, leaf: Leaf):
+        """
+        Store `leaf` as the new version of the page (it is written when
+        evicted). A leaf that does not fit into a page raises ValueError and
+        the page keeps its last version.
+        """
+        data = self.encode(leaf)
+        self.cache[page_id] = leaf
+        self.cache.move_to_end(page_id)
+        self.dirty[page_id] = data
+        self.evict()
+
+    def check(self, leaf: Leaf):
+        """Raise ValueError if `leaf` does not fit into a page"""
+        self.encode(leaf)
+
+    def encode(self, leaf: Leaf) -> bytes:
+        data = self.dumps((leaf.values, leaf.payloads, leaf.next))
+        if PAGE_HEADER.size + len(data) > self.page_size:
+            raise ValueError(
+                "Leaf of {} bytes does not fit into a page of {} bytes: "
+                "use smaller order or bigger page".format(len(data), self.page_size)
+            )
+        return data
+
+    def drop(self, page_id: int):
+        if page_id in self.dirty:
+            self.write(page_id)
+        self.cache.pop(page_id, None)
+
+    def evict(self):
+        while len(self.cache) > self.cache_size:
+            # the page leaves the cache only once it is written
+            self.drop(next(iter(self.cache)))
+
+    def write(self, page_id: int):
+        data = self.dirty[page_id]
+        self.file.seek(page_id * self.page_size)
+        self.file.write(PAGE_HEADER.pack(len(data)) + data)
+        del self.dirty[page_id]
+
+    def flush(self):
+        for page_id in sorted(self.dirty):
+            self.write(page_id)
+        self.file.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.file.close()
+
+
+Pages = Union[MemoryPages, FilePages]
+
+
+class BPlusTree:
+    """
+    B+ tree with the `BinaryTree` add / find / iterate / range API.
+
+    Inner nodes have up to `order` children and live in memory. Values and
+    payloads are in leaves of up to `order` entries, stored in `pages`
+    (in memory by default, or in a file with `FilePages`). Leaves are
+    linked, so iteration reads every page once.
+    """
+
+    def __init__(self, order: int = 64, pages: Optional[Pages] = None):
+        if order < 3:
+            raise ValueError("Order must be at least 3")
+        self.order = order
+        self.pages = pages if pages is not None else MemoryPages()
+        self.root: Union[Inner, int, None] = None
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def close(self):
+        self.pages.close()
+
+    def __enter__(self) -> BPlusTree:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def find_leaf(self, value: T) -> Tuple[int, List[Tuple[Inner, int]]]:
+        """Page id of the leaf for `value` and the path of (node, child index)"""
+        path = []
+        node = self.root
+        while isinstance(node, Inner):
+            index = bisect.bisect_right(node.keys, value)
+            path.append((node, index))
+            node = node.children[index]
+        return node, path
+
+    def add(self, value: T, payload: Any):
+        """
+        Add `value` or overwrite its payload. The stored leaf is never
+        changed in place: new versions of leaves are built and stored, so a
+        leaf that does not fit into a page leaves the tree as it was.
+        """
+        if self.root is None:
+            self.root = self.pages.new(Leaf([value], [payload]))
+            self.length = 1
+            return
+
+        page_id, path = self.find_leaf(value)
+        leaf = self.pages.get(page_id)
+        index = bisect.bisect_left(leaf.values, value)
+        values = list(leaf.values)
+        payloads = list(leaf.payloads)
+
+        if index < len(values) and values[index] == value:
+            # same value => overwrite payload
+            payloads[index] = payload
+            self.pages.put(page_id, Leaf(values, payloads, leaf.next))
+            return
+
+        values.insert(index, value)
+        payloads.insert(index, payload)
+        if len(values) <= self.order:
+            self.pages.put(page_id, Leaf(values, payloads, leaf.next))
+            self.length += 1
+            return
+
+        # split the leaf: right half goes to a new page, both halves are
+        # checked before anything is stored
+        middle = len(values) // 2
+        new_page_id = self.pages.count
+        left = Leaf(values[:middle], payloads[:middle], new_page_id)
+        right = Leaf(values[middle:], payloads[middle:], leaf.next)
+        self.pages.check(left)
+        self.pages.check(right)
+        self.pages.new(right)
+        self.pages.put(page_id, left)
+        self.length += 1
+
+        self.insert_child(path, right.values[0], new_page_id)
+
+    def insert_child(
+        self, path: List[Tuple[Inner, int]], key: T, child: Union[Inner, int]
+    ):
+        """Insert `child` with smallest value `key` next to the end of `path`"""
+        while path:
+            node, index = path.pop()
+            node.keys.insert(index, key)
+            node.children.insert(index + 1, child)
+            if len(node.children) <= self.order:
+                return
+
+            # split the inner node: middle key moves up
+            middle = len(node.keys) // 2
+            key = node.keys[middle]
+            child = Inner(node.keys[middle + 1 :], node.children[middle + 1 :])
+            del node.keys[middle:]
+            del node.children[middle + 1 :]
+
+        self.root = Inner([key], [self.root, child])
+
+    def find(self, value: T) -> Optional[Entry]:
+        if self.root is None:
+            return None
+        page_id, _path = self.find_leaf(value)
+        leaf = self.pages.get(page_id)
+        index = bisect.bisect_left(leaf.values, value)
+        if index < len(leaf.values) and leaf.values[index] == value:
+            return Entry(value=leaf.values[index], payload=leaf.payloads[index])
+        return None
+
+    def iter_leaves(self, page_id: int) -> Iterator[Leaf]:
+        while page_id != NIL:
+            leaf = self.pages.get(page_id)
+            yield leaf
+            page_id = leaf.next
+
+    def __iter__(self) -> Iterator[Entry]:
+        if self.root is None:
+            return
+        node = self.root
+        while isinstance(node, Inner):
+            node = node.children[0]
+        for leaf in self.iter_leaves(node):
+            yield from map(Entry, leaf.values, leaf.payloads)
+
+    def iter_range(self, low: T, high: T) -> Iterator[Entry]:
+        """Entries with `low <= value < high` in order"""
+        if self.root is None:
+            return
+        page_id, _path = self.find_leaf(low)
+        index = None
+        for leaf in self.iter_leaves(page_id):
+            if index is None:
+                index = bisect.bisect_left(leaf.values, low)
+            end = bisect.bisect_left(leaf.values, high, index)
+            yield from map(Entry, leaf.values[index:end], leaf.payloads[index:end])
+            if end < len(leaf.values):
+                return
+            index = 0
+
+    @property
+    def height(self) -> int:
+        height = 0 if self.root is None else 1
+        node = self.root
+        while isinstance(node, Inner):
+            height += 1
+            node = node.children[0]
+        return height
+
+
+def measure_memory(make_tree: Callable[[], Any], values: List[T]) -> float:
+    """Bytes allocated per value (values themselves are not counted)"""
+    gc.collect()
+    tracemalloc.start()
+    tree = make_tree()
+    for value in values:
+        tree.add(value=value, payload=None)
+    allocated, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated / len(values)
+
+
+def bench(sizes: Iterable[int], order: int = 64, cache_size: int = 64):
+    """
+    Insert throughput, memory, and nodes (binary trees) or pages (B+ tree)
+    read per lookup. Every node of a binary tree is a separate object, so
+    each visited node is a likely CPU cache miss; for the file-backed B+ tree
+    only the page cache misses are disk reads.
+    """
+    print(
+        "{:>10} {:>20} {:>12} {:>12} {:>18}".format(
+            "size", "tree", "insert/s", "bytes/value", "misses/lookup"
+        )
+    )
+    for size in sizes:
+        values = random.sample(range(size), size)
+        lookups = values[: min(size, 10000)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            makers = {
+                "BinaryTree": BinaryTree,
+                "BalancedBinaryTree": BalancedBinaryTree,
+                "BPlusTree": lambda: BPlusTree(order=order),
+                "BPlusTree (file)": lambda: BPlusTree(
+                    order=order,
+                    pages=FilePages(
+                        Path(directory) / "tree.bpt", cache_size=cache_size
+                    ),
+                ),
+            }
+            for name, make_tree in makers.items():
+                tree = make_tree()
+                start = time.perf_counter()
+                for value in values:
+                    tree.add(value=value, payload=None)
+                inserts = size / (time.perf_counter() - start)
+
+                if isinstance(tree, BPlusTree):
+                    misses = tree.pages.misses
+                    for value in lookups:
+                        tree.find(value)
+                    if isinstance(tree.pages, FilePages):
+                        misses = (tree.pages.misses - misses) / len(lookups)
+                    else:
+                        # every inner node and leaf is a separate object
+                        misses = tree.height
+                    tree.close()
+                else:
+                    levels = sum(level + 1 for level, _node in tree.traverse())
+                    misses = levels / size
+
+                if isinstance(getattr(tree, "pages", None), FilePages):
+                    memory = "-"  # bounded by the page cache
+                else:
+                    memory = "{:.1f}".format(measure_memory(make_tree, values))
+                print(
+                    "{:>10} {:>20} {:>12.0f} {:>12} {:>18.2f}".format(
+                        size, name, inserts, memory, misses
+                    )
+                )
+
+
+class TestBPlusTree:
+    @pytest.fixture(params=["memory", "file"])
+    def make_tree(self, request, tmp_path):
+        trees = []
+
+        def make_tree(order=4):
+            if request.param == "memory":
+                tree = BPlusTree(order=order)
+            else:
+                pages = FilePages(tmp_path / "tree.bpt", page_size=512, cache_size=3)
+                tree = BPlusTree(order=order, pages=pages)
+            trees.append(tree)
+            return tree
+
+        yield make_tree
+        for tree in trees:
+            tree.close()
+
+    @pytest.mark.parametrize(
+        "values",
+        [
+            list(range(500)),
+            list(range(500, 0, -1)),
+            random.Random(1).sample(range(1000), 500),
+        ],
+    )
+    @pytest.mark.parametrize("order", [3, 4, 5, 16])
+    def test_add(self, make_tree, values, order):
+        tree = make_tree(order=order)
+        for value in values:
+            tree.add(value=value, payload=str(value))
+
+        assert len(tree) == len(values)
+        assert list(tree) == [(value, str(value)) for value in sorted(values)]
+        for value in values:
+            assert tree.find(value) == (value, str(value))
+        assert tree.find(-1) is None
+        assert tree.find(1001) is None
+
+        ordered = sorted(values)
+        for low, high in [(-5, 5), (100, 200), (150, 151), (300, 2000), (5, 5)]:
+            expected = [value for value in ordered if low <= value < high]
+            assert [entry.value for entry in tree.iter_range(low, high)] == expected
+
+    def test_overwrite(self, make_tree):
+        tree = make_tree()
+        for value in range(100):
+            tree.add(value=value, payload="a")
+        for value in range(0, 100, 2):
+            tree.add(value=value, payload="b")
+        assert len(tree) == 100
+        assert [entry.payload for entry in tree] == ["b", "a"] * 50
+
+    def test_same_as_binary_tree(self, make_tree):
+        tree = make_tree(order=8)
+        expected = BinaryTree()
+        for value in random.Random(2).choices(range(300), k=600):
+            tree.add(value=value, payload=value * 2)
+            expected.add(value=value, payload=value * 2)
+        assert list(tree) == [(node.value, node.payload) for node in expected]
+        assert [entry.value for entry in tree.iter_range(50, 150)] == [
+            node.value for node in expected.iter_range(50, 150)
+        ]
+
+    def test_empty(self, make_tree):
+        tree = make_tree()
+        assert len(tree) == 0
+        assert list(tree) == []
+        assert list(tree.iter_range(0, 10)) == []
+        assert tree.find(1) is None
+        assert tree.height == 0
+
+    def test_height(self):
+        tree = BPlusTree(order=4)
+        for value in range(1000):
+            tree.add(value=value, payload=None)
+        # every node but the root is at least half full
+        assert tree.height <= 1 + (1000 // 2).bit_length()
+
+    def test_page_overflow(self, tmp_path):
+        pages = FilePages(tmp_path / "tree.bpt", page_size=256, cache_size=2)
+        tree = BPlusTree(order=16, pages=pages)
+        for value in range(20):
+            tree.add(value=value, payload="x")
+        stored = [(entry.value, entry.payload) for entry in tree]
+
+        # the add that overflows the page fails, not a later eviction
+        with pytest.raises(ValueError):
+            tree.add(value=20, payload="x" * 300)
+        assert [(entry.value, entry.payload) for entry in tree] == stored
+        assert len(tree) == 20
+        tree.add(value=20, payload="x")
+        assert len(tree) == 21
+        tree.close()
+        assert pages.file.closed
+
+    @pytest.mark.parametrize("value", [-1, 1.5, 10])
+    def test_page_overflow_split(self, tmp_path, value):
+        pages = FilePages(tmp_path / "tree.bpt", page_size=256, cache_size=4)
+        tree = BPlusTree(order=4, pages=pages)
+        for stored_value in range(4):
+            tree.add(value=stored_value, payload="x")
+        count = pages.count
+
+        # the full leaf splits, the half with the big payload does not fit
+        with pytest.raises(ValueError):
+            tree.add(value=value, payload="y" * 300)
+        assert [entry.value for entry in tree] == [0, 1, 2, 3]
+        assert len(tree) == 4
+        assert pages.count == count
+        tree.add(value=value, payload="y")
+        assert sorted([entry.value for entry in tree]) == sorted([0, 1, 2, 3, value])
+        tree.close()
+
+
+if __name__ == "__main__":
+    main()
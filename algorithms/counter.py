@@ -1,29 +1,48 @@
 import abc
 import contextlib
 import dataclasses
+import itertools
+import json
 import logging
+import threading
+import time
 from abc import ABC
+from collections import Counter as Histogram
 from contextvars import ContextVar
-from typing import Callable
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+# (steps, start time) of the call in progress of every `AggregatingCounter`
+# by its number. Mappings are replaced, never changed: contexts copied for
+# threads and tasks share them.
+var_current_calls: ContextVar[Mapping[int, Tuple[int, float]]] = ContextVar(
+    "current_calls", default={}
+)
 
 
 class AbstractCounter(ABC):
+    """
+    Counter of algorithm steps.
+
+    Messages are `str.format` templates with positional `args`, so they are
+    only formatted when somebody reads them.
+    """
+
     @abc.abstractmethod
-    def increase(self, name: str):
+    def increase(self, name: str, *args: Any):
         pass
 
     @abc.abstractmethod
-    def finish(self, msg: str = ""):
+    def finish(self, msg: str = "", *args: Any):
         pass
 
 
 class FakeCounter(AbstractCounter):
     @staticmethod
-    def increase(name: str):
+    def increase(name: str, *args: Any):
         pass
 
     @staticmethod
-    def finish(msg: str = ""):
+    def finish(msg: str = "", *args: Any):
         pass
 
 
@@ -35,15 +54,96 @@ class Counter(AbstractCounter):
         self.value = 0
         self.logger = logger
 
-    def increase(self, msg: str):
+    def increase(self, msg: str, *args: Any):
         self.value += 1
-        self.logger.debug("{}. {}".format(self.value, msg))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("{}. {}".format(self.value, msg.format(*args)))
 
-    def finish(self, msg: str = ""):
+    def finish(self, msg: str = "", *args: Any):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         if not msg:
             self.logger.debug("{}. Done.".format(self.value))
         else:
-            self.logger.debug("{}. Done. {}".format(self.value, msg))
+            self.logger.debug("{}. Done. {}".format(self.value, msg.format(*args)))
+
+
+@dataclasses.dataclass(init=False)
+class AggregatingCounter(AbstractCounter):
+    """
+    Counter that does not log but aggregates steps of many calls.
+
+    A call lasts from its first `increase` till `finish`. The state of the
+    current call lives in a ContextVar, so one counter may be shared by
+    threads (running in a copied context) and asyncio tasks.
+
+    >>> counter = AggregatingCounter()
+    >>> for steps in (1, 3, 3):
+    ...     for _ in range(steps):
+    ...         counter.increase("step {}", 1)
+    ...     counter.finish()
+    >>> counter.value, counter.calls, dict(counter.histogram)
+    (7, 3, {1: 1, 3: 2})
+    """
+
+    value: int
+    calls: int
+    histogram: Histogram
+    time_total: float
+    time_min: Optional[float]
+    time_max: Optional[float]
+
+    numbers = itertools.count()
+
+    def __init__(self):
+        self.value = 0
+        self.calls = 0
+        self.histogram = Histogram()
+        self.time_total = 0.0
+        self.time_min = self.time_max = None
+        self.lock = threading.Lock()
+        self.number = next(self.numbers)
+
+    def increase(self, name: str, *args: Any):
+        calls = var_current_calls.get()
+        current = calls.get(self.number)
+        if current is None:
+            current = (1, time.perf_counter())
+        else:
+            current = (current[0] + 1, current[1])
+        var_current_calls.set({**calls, self.number: current})
+
+    def finish(self, msg: str = "", *args: Any):
+        finished = time.perf_counter()
+        calls = dict(var_current_calls.get())
+        current = calls.pop(self.number, None)
+        var_current_calls.set(calls)
+        steps, started = current if current else (0, finished)
+        duration = finished - started
+
+        with self.lock:
+            self.value += steps
+            self.calls += 1
+            self.histogram[steps] += 1
+            self.time_total += duration
+            if self.time_min is None or duration < self.time_min:
+                self.time_min = duration
+            if self.time_max is None or self.time_max < duration:
+                self.time_max = duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "value": self.value,
+                "calls": self.calls,
+                "histogram": {str(k): v for k, v in sorted(self.histogram.items())},
+                "time_total": self.time_total,
+                "time_min": self.time_min,
+                "time_max": self.time_max,
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
 
 
 @contextlib.contextmanager
@@ -54,3 +154,11 @@ def get_counter(variable: ContextVar, fn: Callable):
     token = variable.set(counter)
     yield counter
     variable.reset(token)
+
+
+@contextlib.contextmanager
+def get_aggregating_counter(variable: ContextVar):
+    counter = AggregatingCounter()
+    token = variable.set(counter)
+    yield counter
+    variable.reset(token)
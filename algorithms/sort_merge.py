@@ -1,17 +1,55 @@
 # run this as:
 #   python3.9 -m algorithms.sort_merge
+import array
+import bisect
+import contextlib
+import dataclasses
+import functools
+import heapq
+import os
+import pickle
 import random
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import shared_memory
 from pathlib import Path
-from typing import Iterable, Iterator, List, TypeVar
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import pytest
 
 T = TypeVar("T")
 
+MIN_GALLOP = 7  # wins in a row of one run before merge switches to galloping
+MERGE_BATCH = 1024  # most items merged, written and read at a time by external sort
 
-def mergesort(args: List[T]) -> List[T]:
+
+def mergesort(
+    args: List[T], key: Optional[Callable[[T], Any]] = None, reverse: bool = False
+) -> List[T]:
     """
+    Sort `args` in place, stable, like `list.sort`: `key(item)` is called
+    once per item, with `reverse=True` equal items keep their order too.
+
+    Bottom-up mergesort: existing ascending (or strictly descending, which
+    are reversed) runs are found first, short runs are extended to
+    `get_min_run` items by binary insertion sort, then neighbouring runs are
+    merged pass by pass through one auxiliary buffer. Keys are sorted as a
+    separate list, items are moved along with them.
+
     >>> mergesort([4, 3, 2, 1])
     [1, 2, 3, 4]
     >>> mergesort([4, 2, 3, 1])
@@ -22,48 +60,960 @@ def mergesort(args: List[T]) -> List[T]:
     >>> random.shuffle(data)
     >>> mergesort(data) == list(range(100))
     True
+    >>> mergesort(["bb", "a", "ccc", "dd"], key=len, reverse=True)
+    ['ccc', 'bb', 'dd', 'a']
     """
-    mergesort_(args, 0, len(args) - 1)
+    if reverse:
+        # reversed twice => equal items end up in the original order
+        args.reverse()
+    if key is None:
+        mergesort_(args)
+    else:
+        mergesort_([key(item) for item in args], args)
+    if reverse:
+        args.reverse()
     return args
 
 
+def mergesort_(array: List[T], values: Optional[List[Any]] = None):
+    """Sort `array` in place, `values` (if any) get the same moves"""
+    length = len(array)
+    if length < 2:
+        return
+
+    min_run = get_min_run(length)
+    bounds = [0]
+    while bounds[-1] < length:
+        start = bounds[-1]
+        end = find_run(array, start, length, values)
+        if end - start < min_run:
+            sorted_end = end
+            end = min(start + min_run, length)
+            insertion_sort(array, start, sorted_end, end, values)
+        bounds.append(end)
+
+    merge_passes(array, bounds, values)
+
+
+def merge_passes(array: List[T], bounds: List[int], values: Optional[List[Any]] = None):
+    """Merge sorted runs `array[bounds[i]:bounds[i + 1]]` pairwise, pass by pass"""
+    buffer = [None] * (len(array) // 2 + 1)
+    values_buffer = None if values is None else list(buffer)
+    while len(bounds) > 2:
+        for i in range(0, len(bounds) - 2, 2):
+            merge_runs(
+                array,
+                buffer,
+                bounds[i],
+                bounds[i + 1],
+                bounds[i + 2],
+                values,
+                values_buffer,
+            )
+        bounds = bounds[::2] if len(bounds) % 2 else bounds[::2] + [bounds[-1]]
+
+
+def get_min_run(length: int) -> int:
+    """
+    Length of runs in 32..64, such that `length / min_run` is a power of 2
+    or a bit less, so passes merge runs of about equal lengths.
+
+    >>> get_min_run(63), get_min_run(64), get_min_run(65), get_min_run(2 ** 20)
+    (63, 32, 33, 32)
+    """
+    remainder = 0
+    while length >= 64:
+        remainder |= length & 1
+        length >>= 1
+    return length + remainder
+
+
+def find_run(
+    array: List[T], start: int, end: int, values: Optional[List[Any]] = None
+) -> int:
+    """
+    Return the end of the run at `start`. A strictly descending run is
+    reversed in place (equal items never swap => stable).
+
+    >>> data = [3, 2, 1, 1, 5]
+    >>> find_run(data, 0, 5), data
+    (3, [1, 2, 3, 1, 5])
+    >>> find_run(data, 3, 5)
+    5
+    """
+    run_end = start + 1
+    if run_end == end:
+        return end
+
+    if array[run_end] < array[start]:
+        while run_end + 1 < end and array[run_end + 1] < array[run_end]:
+            run_end += 1
+        run_end += 1
+        array[start:run_end] = array[start:run_end][::-1]
+        if values is not None:
+            values[start:run_end] = values[start:run_end][::-1]
+    else:
+        while run_end + 1 < end and not array[run_end + 1] < array[run_end]:
+            run_end += 1
+        run_end += 1
+    return run_end
+
+
+def insertion_sort(
+    array: List[T],
+    start: int,
+    sorted_end: int,
+    end: int,
+    values: Optional[List[Any]] = None,
+):
+    """Insert items of `array[sorted_end:end]` into sorted `array[start:sorted_end]`"""
+    for i in range(sorted_end, end):
+        item = array[i]
+        position = bisect.bisect_right(array, item, start, i)
+        if position < i:
+            array[position + 1 : i + 1] = array[position:i]
+            array[position] = item
+            if values is not None:
+                value = values[i]
+                values[position + 1 : i + 1] = values[position:i]
+                values[position] = value
+
+
+def merge_runs(
+    array: List[T],
+    buffer: List[T],
+    start: int,
+    middle: int,
+    end: int,
+    values: Optional[List[Any]] = None,
+    values_buffer: Optional[List[Any]] = None,
+):
+    """
+    Merge sorted `array[start:middle]` and `array[middle:end]` in place, the
+    smaller side is moved aside to `buffer` (which grows if it is too short).
+    `values` get the same moves through `values_buffer`.
+
+    >>> data = [1, 3, 5, 7, 2, 4, 6]
+    >>> merge_runs(data, [None] * 2, 0, 4, 7)
+    >>> data
+    [1, 2, 3, 4, 5, 6, 7]
+    """
+    # items that are already in place are skipped
+    start = bisect.bisect_right(array, array[middle], start, middle)
+    if start == middle:
+        return
+    end = bisect.bisect_left(array, array[middle - 1], middle, end)
+
+    if middle - start <= end - middle:
+        merge_low(array, buffer, start, middle, end, values, values_buffer)
+    else:
+        merge_high(array, buffer, start, middle, end, values, values_buffer)
+
+
+def merge_low(
+    array: List[T],
+    buffer: List[T],
+    start: int,
+    middle: int,
+    end: int,
+    values: Optional[List[Any]] = None,
+    values_buffer: Optional[List[Any]] = None,
+):
+    left_end = middle - start
+    buffer[:left_end] = array[start:middle]
+    has_values = values is not None
+    if has_values:
+        values_buffer[:left_end] = values[start:middle]
+
+    i = 0  # next left item in the buffer
+    j = middle  # next right item
+    k = start  # where the next merged item goes
+    left_wins = right_wins = 0
+
+    while i < left_end and j < end:
+        if array[j] < buffer[i]:
+            array[k] = array[j]
+            if has_values:
+                values[k] = values[j]
+            j += 1
+            k += 1
+            right_wins += 1
+            left_wins = 0
+            if right_wins >= MIN_GALLOP:
+                found = bisect.bisect_left(array, buffer[i], j, end)
+                array[k : k + found - j] = array[j:found]
+                if has_values:
+                    values[k : k + found - j] = values[j:found]
+                k += found - j
+                j = found
+                right_wins = 0
+        else:
+            array[k] = buffer[i]
+            if has_values:
+                values[k] = values_buffer[i]
+            i += 1
+            k += 1
+            left_wins += 1
+            right_wins = 0
+            if left_wins >= MIN_GALLOP:
+                found = bisect.bisect_right(buffer, array[j], i, left_end)
+                array[k : k + found - i] = buffer[i:found]
+                if has_values:
+                    values[k : k + found - i] = values_buffer[i:found]
+                k += found - i
+                i = found
+                left_wins = 0
+
+    # the rest of the right run is already in place
+    array[k : k + left_end - i] = buffer[i:left_end]
+    if has_values:
+        values[k : k + left_end - i] = values_buffer[i:left_end]
+
+
+def merge_high(
+    array: List[T],
+    buffer: List[T],
+    start: int,
+    middle: int,
+    end: int,
+    values: Optional[List[Any]] = None,
+    values_buffer: Optional[List[Any]] = None,
+):
+    right_end = end - middle
+    buffer[:right_end] = array[middle:end]
+    has_values = values is not None
+    if has_values:
+        values_buffer[:right_end] = values[middle:end]
+
+    i = middle - 1  # next left item, from the end
+    j = right_end - 1  # next right item in the buffer, from the end
+    k = end - 1  # where the next merged item goes, from the end
+    left_wins = right_wins = 0
+
+    while i >= start and j >= 0:
+        if buffer[j] < array[i]:
+            array[k] = array[i]
+            if has_values:
+                values[k] = values[i]
+            i -= 1
+            k -= 1
+            left_wins += 1
+            right_wins = 0
+            if left_wins >= MIN_GALLOP:
+                found = bisect.bisect_right(array, buffer[j], start, i + 1)
+                moved = i + 1 - found
+                array[k - moved + 1 : k + 1] = array[found : i + 1]
+                if has_values:
+                    values[k - moved + 1 : k + 1] = values[found : i + 1]
+                k -= moved
+                i = found - 1
+                left_wins = 0
+        else:
+            array[k] = buffer[j]
+            if has_values:
+                values[k] = values_buffer[j]
+            j -= 1
+            k -= 1
+            right_wins += 1
+            left_wins = 0
+            if right_wins >= MIN_GALLOP:
+                found = bisect.bisect_left(buffer, array[i], 0, j + 1)
+                moved = j + 1 - found
+                array[k - moved + 1 : k + 1] = buffer[found : j + 1]
+                if has_values:
+                    values[k - moved + 1 : k + 1] = values_buffer[found : j + 1]
+                k -= moved
+                j = found - 1
+                right_wins = 0
+
+    # the rest of the left run is already in place
+    array[start : start + j + 1] = buffer[: j + 1]
+    if has_values:
+        values[start : start + j + 1] = values_buffer[: j + 1]
+
+
+def parallel_mergesort(
+    args: List[T], workers: Optional[int] = None, min_size: int = 10 ** 5
+) -> List[T]:
+    """
+    Sort `args` in place with `mergesort` on `workers` processes (one per CPU
+    by default), stable. Inputs shorter than `min_size` are sorted in process.
+
+    Every worker sorts one chunk, then sorted chunks are merged pairwise.
+    Lists of plain ints (64-bit) or floats are passed through shared memory
+    and also merged by workers, other items are pickled to workers and
+    merged in process.
+
+    >>> data = [random.randrange(1000) for _ in range(1000)]
+    >>> parallel_mergesort(list(data), workers=2, min_size=0) == sorted(data)
+    True
+    """
+    length = len(args)
+    workers = min(workers or os.cpu_count() or 1, max(1, length))
+    if workers == 1 or length < min_size:
+        return mergesort(args)
+
+    bounds = [length * i // workers for i in range(workers + 1)]
+    typecode = get_typecode(args)
+    with ProcessPoolExecutor(workers) as executor:
+        if typecode is None:
+            chunks = executor.map(mergesort, (args[a:b] for a, b in pairwise(bounds)))
+            for start, chunk in zip(bounds, chunks):
+                args[start : start + len(chunk)] = chunk
+            merge_passes(args, bounds)
+        else:
+            sort_shared(executor, args, bounds, typecode)
+    return args
+
+
+def get_typecode(items: List[Any]) -> Optional[str]:
+    """
+    `array` typecode that holds all `items` without loss, or None
+
+    >>> get_typecode([1, -2 ** 63]), get_typecode([0.5, 1.0]), get_typecode([1, 0.5])
+    ('q', 'd', None)
+    >>> get_typecode([2 ** 63]), get_typecode([True]), get_typecode([])
+    (None, None, None)
+    """
+    types = set(map(type, items))
+    if types == {int} and -(2 ** 63) <= min(items) and max(items) < 2 ** 63:
+        return "q"
+    if types == {float}:
+        return "d"
+    return None
+
+
+def pairwise(items: List[T]) -> Iterator[Tuple[T, T]]:
+    return zip(items, islice(items, 1, None))
+
+
+def sort_shared(
+    executor: ProcessPoolExecutor, args: List[T], bounds: List[int], typecode: str
+):
+    itemsize = array.array(typecode).itemsize
+    memory = shared_memory.SharedMemory(create=True, size=len(args) * itemsize)
+    view = memory.buf.cast(typecode)
+    try:
+        view[:] = array.array(typecode, args)
+
+        sort_chunk = functools.partial(sort_shared_chunk, memory.name, typecode)
+        # a chunk is sorted when its start and middle are the same
+        list(executor.map(sort_chunk, bounds[:-1], bounds[:-1], bounds[1:]))
+        while len(bounds) > 2:
+            list(executor.map(sort_chunk, bounds[:-2:2], bounds[1:-1:2], bounds[2::2]))
+            bounds = bounds[::2] if len(bounds) % 2 else bounds[::2] + [bounds[-1]]
+
+        args[:] = view.tolist()
+    finally:
+        # the view must be gone before shared memory is closed
+        view.release()
+        memory.close()
+        memory.unlink()
+
+
+def sort_shared_chunk(name: str, typecode: str, start: int, middle: int, end: int):
+    """
+    Sort `start:end` items of a shared memory block (when `start == middle`)
+    or merge its sorted `start:middle` and `middle:end` parts
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    view = memory.buf.cast(typecode)
+    try:
+        chunk = view[start:end].tolist()
+        if start == middle:
+            mergesort(chunk)
+        else:
+            merge_passes(chunk, [0, middle - start, end - start])
+        view[start:end] = array.array(typecode, chunk)
+    finally:
+        view.release()
+        memory.close()
+
+
 def sort_merge(a: Iterator[T], b: Iterator[T]) -> Iterable[T]:
-    a_next = next(a, None)
-    b_next = next(b, None)
+    """
+    Merge two sorted iterators, equal values of `a` go first (stable)
+
+    >>> list(sort_merge(iter([0, 0, 2]), iter([0, 1])))
+    [0, 0, 0, 1, 2]
+    >>> list(sort_merge(iter([None]), iter([])))
+    [None]
+    >>> list(sort_merge(iter([(1, "a"), (2, "a")]), iter([(1, "a"), (3, "b")])))
+    [(1, 'a'), (1, 'a'), (2, 'a'), (3, 'b')]
+    """
+    missing = object()
+    a_next = next(a, missing)
+    b_next = next(b, missing)
 
-    while a_next is not None or b_next is not None:
-        if b_next is None or (a_next is not None and a_next < b_next):
+    while a_next is not missing and b_next is not missing:
+        if b_next < a_next:
+            yield b_next
+            b_next = next(b, missing)
+        else:
             yield a_next
-            a_next = next(a, None)
+            a_next = next(a, missing)
+
+    if a_next is not missing:
+        yield a_next
+        yield from a
+    if b_next is not missing:
+        yield b_next
+        yield from b
+
+
+def merge_sorted(
+    *iterables: Iterable[T],
+    key: Optional[Callable[[T], Any]] = None,
+    batch_size: int = 64,
+) -> Iterator[T]:
+    """
+    Lazily merge any number of sorted iterables with a heap. Merge is stable:
+    on equal keys items of the earlier iterable go first. Keys are computed
+    once per item, items are pulled from inputs in batches of `batch_size`.
+
+    >>> list(merge_sorted([1, 4, 7], [2, 5, 8], [3, 6, 9], []))
+    [1, 2, 3, 4, 5, 6, 7, 8, 9]
+    >>> list(merge_sorted(["b", "ccc"], ["a", "dd"], ["ee"], key=len))
+    ['b', 'a', 'dd', 'ee', 'ccc']
+    >>> list(merge_sorted([None, None], [None], key=lambda x: 0))
+    [None, None, None]
+    >>> inputs = [range(i, 10000, 1000) for i in range(1000)]
+    >>> list(merge_sorted(*inputs, batch_size=3)) == list(range(10000))
+    True
+    >>> merge_sorted([1], batch_size=0)
+    Traceback (most recent call last):
+    ...
+    ValueError: Batch size must be positive: 0
+    """
+    if batch_size <= 0:
+        raise ValueError("Batch size must be positive: {}".format(batch_size))
+    return _merge_sorted(iterables, key, batch_size)
+
+
+def _merge_sorted(
+    iterables: Tuple[Iterable[T], ...],
+    key: Optional[Callable[[T], Any]],
+    batch_size: int,
+) -> Iterator[T]:
+    iterators = []
+    batches = []
+    positions = []
+    heap = []
+
+    for iterator in map(iter, iterables):
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            continue
+        index = len(iterators)
+        iterators.append(iterator)
+        batches.append(batch)
+        positions.append(0)
+        item = batch[0]
+        # input index breaks ties => stable, items are never compared
+        heap.append((item if key is None else key(item), index, item))
+
+    heapq.heapify(heap)
+
+    while len(heap) > 1:
+        _key, index, item = heap[0]
+        yield item
+
+        position = positions[index] + 1
+        batch = batches[index]
+        if position == len(batch):
+            batch = batches[index] = list(islice(iterators[index], batch_size))
+            position = 0
+            if not batch:
+                heapq.heappop(heap)
+                continue
+
+        positions[index] = position
+        item = batch[position]
+        heapq.heapreplace(heap, (item if key is None else key(item), index, item))
+
+    if heap:
+        # the last input => no merge is needed
+        _key, index, item = heap[0]
+        yield item
+        yield from islice(batches[index], positions[index] + 1, None)
+        yield from iterators[index]
+
+
+@dataclasses.dataclass
+class ExternalSortStats:
+    items: int = 0
+    runs: int = 0
+    merge_passes: int = 0  # intermediate passes, the final merge is not counted
+    batch_size: int = 0  # items read from a run at a time during the merge
+    sort_time: float = 0.0  # sorting chunks in memory
+    write_time: float = 0.0  # spilling runs to files
+    read_time: float = 0.0  # reading runs back (part of merge time)
+    merge_time: float = 0.0  # merging runs, including reading them
+
+    @property
+    def io_time(self) -> float:
+        return self.write_time + self.read_time
+
+    @property
+    def cpu_time(self) -> float:
+        return self.sort_time + self.merge_time - self.read_time
+
+
+def external_sort(
+    items: Iterable[T],
+    memory_budget: int = 64 * 2 ** 20,
+    key: Optional[Callable[[T], Any]] = None,
+    lines: bool = False,
+    directory: Optional[Union[str, Path]] = None,
+    stats: Optional[ExternalSortStats] = None,
+    max_fan_in: int = 128,
+) -> Iterator[T]:
+    """
+    Sort more items than fit in memory, stable.
+
+    Items are read in chunks of about `memory_budget` bytes (shallow
+    `sys.getsizeof` of items), every chunk is sorted and spilled to a
+    temporary file as a run, then runs are k-way merged back lazily.
+    Runs are pickled in batches, or written as text with `lines=True`
+    (items are strings without line breaks).
+
+    At most `max_fan_in` runs are open at once: while there are more runs,
+    intermediate passes merge consecutive groups of them into longer runs.
+    Runs are read in batches sized so that the batches buffered by a merge
+    of `max_fan_in` runs fit in `memory_budget` too (file buffers aside).
+
+    >>> data = [random.randrange(100) for _ in range(1000)]
+    >>> stats = ExternalSortStats()
+    >>> list(external_sort(data, memory_budget=2000, stats=stats)) == sorted(data)
+    True
+    >>> stats.items, stats.runs > 10
+    (1000, True)
+    >>> list(external_sort(["b", "a", "c"], lines=True))
+    ['a', 'b', 'c']
+    """
+    if max_fan_in < 2:
+        raise ValueError("Fan-in must be at least 2: {}".format(max_fan_in))
+    if stats is None:
+        stats = ExternalSortStats()
+
+    with tempfile.TemporaryDirectory(dir=directory) as temp_directory:
+        paths = []
+        for chunk in iter_chunks(items, memory_budget):
+            stats.items += len(chunk)
+
+            started = time.perf_counter()
+            chunk.sort(key=key)
+            sorted_ = time.perf_counter()
+            stats.sort_time += sorted_ - started
+
+            if not stats.batch_size:
+                stats.batch_size = get_batch_size(chunk, memory_budget, max_fan_in)
+            path = Path(temp_directory) / "run-{}".format(stats.runs)
+            write_run(path, chunk, lines=lines, batch_size=stats.batch_size)
+            paths.append(path)
+            stats.runs += 1
+            stats.write_time += time.perf_counter() - sorted_
+
+        if not paths:
+            return
+        if len(paths) == 1:
+            # everything fits in memory => nothing to merge
+            yield from chunk
+            return
+
+        while len(paths) > max_fan_in:
+            merged_paths = []
+            for start in range(0, len(paths), max_fan_in):
+                group = paths[start : start + max_fan_in]
+                if len(group) == 1:
+                    merged_paths.append(group[0])
+                    continue
+                path = Path(temp_directory) / "run-{}".format(stats.runs)
+                stats.runs += 1
+                with open_runs(group, lines, stats) as runs:
+                    with open(path, "w" if lines else "wb") as file:
+                        for batch in merge_batches(runs, key, stats):
+                            started = time.perf_counter()
+                            write_batch(file, batch, lines)
+                            stats.write_time += time.perf_counter() - started
+                for run_path in group:
+                    run_path.unlink()
+                merged_paths.append(path)
+            paths = merged_paths
+            stats.merge_passes += 1
+
+        with open_runs(paths, lines, stats) as runs:
+            for batch in merge_batches(runs, key, stats):
+                yield from batch
+
+
+def iter_chunks(items: Iterable[T], memory_budget: int) -> Iterator[List[T]]:
+    chunk = []
+    size = 0
+    for item in items:
+        chunk.append(item)
+        size += sys.getsizeof(item) + 8  # + pointer in the list
+        if size >= memory_budget:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def get_batch_size(items: List[T], memory_budget: int, fan_in: int) -> int:
+    """
+    Items per batch for merging `fan_in` runs of items like `items`: every
+    run has a batch being read and one inside `merge_sorted`, and there is
+    one merged batch, so the budget is split into `2 * fan_in + 1` batches
+
+    >>> get_batch_size([0] * 10, memory_budget=1, fan_in=5)
+    1
+    >>> get_batch_size([0] * 10, memory_budget=2 ** 30, fan_in=5) == MERGE_BATCH
+    True
+    """
+    item_size = sum(sys.getsizeof(item) + 8 for item in items) / len(items)
+    batch_size = int(memory_budget / (item_size * (2 * fan_in + 1)))
+    return max(1, min(MERGE_BATCH, batch_size))
+
+
+def write_run(path: Path, items: List[T], lines: bool, batch_size: int = MERGE_BATCH):
+    with open(path, "w" if lines else "wb") as file:
+        for start in range(0, len(items), batch_size):
+            write_batch(file, items[start : start + batch_size], lines)
+
+
+def write_batch(file: IO, batch: List[T], lines: bool):
+    if lines:
+        file.writelines(item + "\n" for item in batch)
+    else:
+        pickle.dump(batch, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+@contextlib.contextmanager
+def open_runs(
+    paths: List[Path], lines: bool, stats: ExternalSortStats
+) -> Iterator[List[Iterator[Any]]]:
+    with contextlib.ExitStack() as stack:
+        files = [
+            stack.enter_context(open(path, "r" if lines else "rb")) for path in paths
+        ]
+        yield [read_run(file, lines, stats, stats.batch_size) for file in files]
+
+
+def merge_batches(
+    runs: List[Iterator[T]],
+    key: Optional[Callable[[T], Any]],
+    stats: ExternalSortStats,
+) -> Iterator[List[T]]:
+    merged = merge_sorted(*runs, key=key, batch_size=stats.batch_size)
+    while True:
+        started = time.perf_counter()
+        batch = list(islice(merged, stats.batch_size))
+        stats.merge_time += time.perf_counter() - started
+        if not batch:
+            return
+        yield batch
+
+
+def read_run(
+    file: IO, lines: bool, stats: ExternalSortStats, batch_size: int = MERGE_BATCH
+) -> Iterator[T]:
+    """Items of a run, pickled runs are read in the batches they were written"""
+    while True:
+        started = time.perf_counter()
+        if lines:
+            batch = [line[:-1] for line in islice(file, batch_size)]
         else:
-            yield b_next
-            b_next = next(b, None)
+            try:
+                batch = pickle.load(file)
+            except EOFError:
+                batch = []
+        stats.read_time += time.perf_counter() - started
+        if not batch:
+            return
+        yield from batch
 
 
-def merge(arr: List[T], left: int, middle: int, right: int):
-    left_copy = list(arr[left : middle + 1])
-    right_copy = list(arr[middle + 1 : right + 1])
+def external_sort_file(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    memory_budget: int = 64 * 2 ** 20,
+    stats: Optional[ExternalSortStats] = None,
+):
+    """Sort lines of a text file into another file"""
+    with open(input_path) as input_file, open(output_path, "w") as output_file:
+        items = (line.rstrip("\n") for line in input_file)
+        for line in external_sort(items, memory_budget, lines=True, stats=stats):
+            output_file.write(line + "\n")
 
-    left_iter = iter(left_copy)
-    right_iter = iter(right_copy)
 
-    for i, value in enumerate(sort_merge(left_iter, right_iter), left):
-        arr[i] = value
+def bench(memory_budget: int = 2 ** 20):
+    bench_mergesort()
+    print()
+    bench_external_sort(memory_budget)
 
 
-def mergesort_(array: List[T], left: int, right: int):
-    if left >= right:
-        return
+def bench_mergesort(size: int = 10 ** 5):
+    half = size // 2
+    cases = {
+        "random": lambda: random.sample(range(size), size),
+        "sorted": lambda: list(range(size)),
+        "reversed": lambda: list(range(size, 0, -1)),
+        "two runs": lambda: sorted(random.sample(range(size), half)) * 2,
+        "1% swaps": lambda: swap_some(list(range(size)), size // 100),
+    }
+    print("{:>10} {:>12} {:>12}".format("data", "mergesort, s", "sorted, s"))
+    for name, make_data in cases.items():
+        data = make_data()
+        start = time.perf_counter()
+        sorted(data)
+        builtin = time.perf_counter() - start
+        start = time.perf_counter()
+        mergesort(data)
+        ours = time.perf_counter() - start
+        print("{:>10} {:>12.4f} {:>12.4f}".format(name, ours, builtin))
+
+
+def swap_some(data: List[T], count: int) -> List[T]:
+    for _ in range(count):
+        i = random.randrange(len(data))
+        j = random.randrange(len(data))
+        data[i], data[j] = data[j], data[i]
+    return data
+
+
+def bench_parallel(size: int = 10 ** 6, max_workers: Optional[int] = None):
+    """Speedup of `parallel_mergesort` over `mergesort` for 1..N workers"""
+    data = [random.randrange(2 ** 32) for _ in range(size)]
+    print("{:>8} {:>10} {:>8}".format("workers", "time, s", "speedup"))
+    for workers in range(1, (max_workers or os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        parallel_mergesort(list(data), workers=workers, min_size=0)
+        duration = time.perf_counter() - start
+        if workers == 1:
+            single = duration
+        print("{:>8} {:>10.3f} {:>8.2f}".format(workers, duration, single / duration))
+
+
+def bench_external_sort(memory_budget: int = 2 ** 20, factor: int = 10):
+    """Sort `factor` times more data than the memory budget"""
+    print(
+        "{:>8} {:>10} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            "format",
+            "items",
+            "runs",
+            "sort, s",
+            "write, s",
+            "read, s",
+            "io, s",
+            "cpu, s",
+        )
+    )
+    item_size = sys.getsizeof(10 ** 9) + 8
+    count = memory_budget * factor // item_size
+    for lines in (False, True):
+        data = (random.randrange(10 ** 9) for _ in range(count))
+        if lines:
+            data = ("{:09}".format(value) for value in data)
+        stats = ExternalSortStats()
+        for _item in external_sort(data, memory_budget, lines=lines, stats=stats):
+            pass
+        print(
+            "{:>8} {:>10} {:>6} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f}".format(
+                "lines" if lines else "pickle",
+                stats.items,
+                stats.runs,
+                stats.sort_time,
+                stats.write_time,
+                stats.read_time,
+                stats.io_time,
+                stats.cpu_time,
+            )
+        )
+
+
+class TestMergesort:
+    @pytest.mark.parametrize("size", [0, 1, 2, 31, 32, 33, 64, 65, 100, 1000, 5000])
+    def test_random(self, size):
+        data = [random.randrange(size // 3 + 1) for _ in range(size)]
+        assert mergesort(list(data)) == sorted(data)
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            list(range(1000)),
+            list(range(1000, 0, -1)),
+            [0] * 1000,
+            list(range(500)) + list(range(500)),
+            list(range(500, 0, -1)) + list(range(500)),
+            list(range(10)) * 100,
+            list(range(0, 1000, 2)) + list(range(1, 1000, 2)),
+            list(range(100)) + list(range(100, 1000))[::-1],
+            [3, 2, 2, 1] * 250,
+        ],
+    )
+    def test_patterns(self, data):
+        assert mergesort(list(data)) == sorted(data)
+
+    @pytest.mark.parametrize("size", [10, 100, 1000, 10000])
+    def test_stable(self, size):
+        @dataclasses.dataclass(order=True)
+        class Item:
+            key: int
+            index: int = dataclasses.field(compare=False)
+
+        data = [Item(random.randrange(10), index) for index in range(size)]
+        data[size // 2 :] = sorted(data[size // 2 :], reverse=True)
+        result = mergesort(list(data))
+        assert [(item.key, item.index) for item in result] == [
+            (item.key, item.index) for item in sorted(data)
+        ]
+
+    @pytest.mark.parametrize("reverse", [False, True])
+    @pytest.mark.parametrize("size", [0, 1, 10, 100, 1000, 5000])
+    def test_key(self, size, reverse):
+        data = [(random.randrange(10), index) for index in range(size)]
+        data[size // 2 :] = sorted(data[size // 2 :], reverse=True)
+        calls = []
+
+        def key(item):
+            calls.append(item)
+            return item[0]
+
+        result = mergesort(list(data), key=key, reverse=reverse)
+        assert len(calls) == size
+        assert result == sorted(data, key=lambda item: item[0], reverse=reverse)
+
+    def test_reverse(self):
+        data = [random.randrange(100) for _ in range(1000)]
+        assert mergesort(list(data), reverse=True) == sorted(data, reverse=True)
+
+    def test_galloping(self):
+        # one run dominates the other in long stretches
+        left = list(range(0, 10000, 10)) + list(range(20000, 30000))
+        right = list(range(10000, 20000)) + list(range(5, 10000, 10))
+        data = sorted(left) + sorted(right)
+        assert mergesort(list(data)) == sorted(data)
+
+
+class TestParallelMergesort:
+    @pytest.mark.parametrize("workers", [1, 2, 3])
+    @pytest.mark.parametrize(
+        "make_item",
+        [
+            lambda value: value,
+            lambda value: value - 2 ** 63,
+            lambda value: value / 7,
+            lambda value: str(value),
+            lambda value: 2 ** 70 + value,
+        ],
+    )
+    def test_sort(self, workers, make_item):
+        data = [make_item(random.randrange(1000)) for _ in range(1001)]
+        result = parallel_mergesort(list(data), workers=workers, min_size=0)
+        assert result == sorted(data)
+
+    def test_stable(self):
+        data = [(random.randrange(10), str(index)) for index in range(1000)]
+        result = parallel_mergesort(list(data), workers=3, min_size=0)
+        assert result == sorted(data)
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 5])
+    def test_small(self, size):
+        data = list(range(size, 0, -1))
+        assert parallel_mergesort(data, workers=4, min_size=0) == sorted(data)
+
+    def test_in_process(self):
+        data = [3, 1, 2]
+        assert parallel_mergesort(data, workers=4) is data
+        assert data == [1, 2, 3]
+
+    def test_worker_error(self):
+        class FailingExecutor:
+            def map(self, *args):
+                raise RuntimeError("worker died")
+
+        # not a BufferError from closing shared memory with a live view
+        with pytest.raises(RuntimeError):
+            sort_shared(FailingExecutor(), [3, 1, 2], [0, 3], "q")
+
+
+class TestExternalSort:
+    @pytest.mark.parametrize("memory_budget", [1, 100, 1000, 10 ** 6])
+    @pytest.mark.parametrize("lines", [False, True])
+    def test_sort(self, memory_budget, lines):
+        data = [random.randrange(1000) for _ in range(2000)]
+        if lines:
+            data = ["{:04}".format(value) for value in data]
+        result = external_sort(iter(data), memory_budget=memory_budget, lines=lines)
+        assert list(result) == sorted(data)
+
+    def test_stable(self):
+        data = [(random.randrange(10), index) for index in range(1000)]
+        result = external_sort(data, memory_budget=500, key=lambda item: item[0])
+        assert list(result) == sorted(data, key=lambda item: item[0])
+
+    @pytest.mark.parametrize("max_fan_in, merge_passes", [(2, 9), (7, 3), (1000, 0)])
+    @pytest.mark.parametrize("lines", [False, True])
+    def test_fan_in(self, max_fan_in, merge_passes, lines, monkeypatch):
+        data = ["{:04}".format(random.randrange(1000)) for _ in range(1000)]
+        fan_ins = []
+        merge = merge_sorted
+
+        def merge_sorted_spy(*iterables, **kwargs):
+            fan_ins.append(len(iterables))
+            return merge(*iterables, **kwargs)
+
+        monkeypatch.setattr(sys.modules[__name__], "merge_sorted", merge_sorted_spy)
+        stats = ExternalSortStats()
+        result = external_sort(
+            data, memory_budget=1, lines=lines, stats=stats, max_fan_in=max_fan_in
+        )
+        assert list(result) == sorted(data)
+        assert max(fan_ins) <= max_fan_in
+        assert stats.merge_passes == merge_passes
+        with pytest.raises(ValueError):
+            list(external_sort(data, max_fan_in=1))
+
+    @pytest.mark.parametrize("lines", [False, True])
+    def test_batch_size(self, lines):
+        data = ["{:04}".format(random.randrange(1000)) for _ in range(2000)]
+        item_size = sys.getsizeof(data[0]) + 8
+        stats = ExternalSortStats()
+        result = external_sort(
+            data, memory_budget=10 ** 4, lines=lines, stats=stats, max_fan_in=8
+        )
+        assert list(result) == sorted(data)
+        assert stats.merge_passes == 1
+        assert stats.batch_size == 10 ** 4 // (item_size * 17)
+        assert stats.batch_size * item_size * 17 <= 10 ** 4
+
+    def test_empty(self):
+        assert list(external_sort([])) == []
+
+    def test_none(self):
+        assert list(external_sort([None, None], memory_budget=1)) == [None, None]
 
-    middle = (left + right - 1) // 2
-    mergesort_(array, left, middle)
-    mergesort_(array, middle + 1, right)
-    merge(array, left, middle, right)
+    def test_file(self, tmp_path):
+        data = ["{:05}".format(random.randrange(10 ** 5)) for _ in range(1000)]
+        input_path = tmp_path / "input.txt"
+        input_path.write_text("".join(line + "\n" for line in data))
+        output_path = tmp_path / "output.txt"
+        stats = ExternalSortStats()
+        external_sort_file(input_path, output_path, memory_budget=4000, stats=stats)
+        assert output_path.read_text().splitlines() == sorted(data)
+        assert stats.runs > 1
+        assert stats.io_time > 0
 
 
 if __name__ == "__main__":
     if len(sys.argv) == 2 and sys.argv[1] == "test":
         pytest.main(sys.argv[:1])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench-parallel":
+        bench_parallel(*[int(value) for value in sys.argv[2:4]])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench(*[int(value) for value in sys.argv[2:3]])
     elif len(sys.argv) > 1:
         path, *values = sys.argv
         values = [int(value) for value in values]
@@ -72,5 +1022,10 @@ if __name__ == "__main__":
         print(f"For values {' '.join(sys.argv[1:])} quicksort is {' '.join(result)}")
     else:
         file_path = Path(sys.argv[0]).name
-        print(f"Usage: {file_path} test OR {file_path} *<VALUE>", file=sys.stderr)
+        print(
+            f"Usage: {file_path} test OR {file_path} bench [<MEMORY_BUDGET>] "
+            f"OR {file_path} bench-parallel [<SIZE> [<MAX_WORKERS>]] "
+            f"OR {file_path} *<VALUE>",
+            file=sys.stderr,
+        )
         exit(1)
@@ -1,17 +1,36 @@
 # run this as:
 #   python3.9 -m algorithms.sort_quick
+import heapq
 import random
 import sys
+import time
+from itertools import islice
 from pathlib import Path
-from typing import List, TypeVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 
 import pytest
 
+from algorithms.binaryheap import Heap, sift_down_max
+from algorithms.sort_merge import mergesort
+
 T = TypeVar("T")
 
+INSERTION_SORT_SIZE = 16  # slices up to this length are insertion sorted
+NINTHER_SIZE = 40  # slices from this length take the pivot from 9 items, not 3
+
 
-def quicksort(args: List[T]) -> List[T]:
+def quicksort(
+    args: List[T], key: Optional[Callable[[T], Any]] = None, reverse: bool = False
+) -> List[T]:
     """
+    Sort `args` in place, not stable. `key(item)` is called once per item:
+    keys are sorted as a separate list, items are moved along with them.
+
+    Introsort: 3-way partitioning around a median-of-3 (or ninther) pivot,
+    the smaller side is sorted first by recursion, the bigger one in a loop.
+    Slices that keep partitioning badly are heap sorted, short ones are
+    insertion sorted.
+
     >>> quicksort([4, 3, 2, 1])
     [1, 2, 3, 4]
     >>> quicksort([4, 2, 3, 1])
@@ -22,8 +41,15 @@ def quicksort(args: List[T]) -> List[T]:
     >>> random.shuffle(data)
     >>> quicksort(data) == list(range(100))
     True
+    >>> quicksort(["bb", "a", "ccc"], key=len, reverse=True)
+    ['ccc', 'bb', 'a']
     """
-    quicksort_(args, 0, len(args) - 1)
+    if key is None:
+        quicksort_(args, 0, len(args) - 1)
+    else:
+        quicksort_([key(item) for item in args], 0, len(args) - 1, values=args)
+    if reverse:
+        args.reverse()
     return args
 
 
@@ -33,33 +59,585 @@ def swap(arr: List[T], a: int, b: int):
     arr[a], arr[b] = arr[b], arr[a]
 
 
-def partition(arr: List[T], low: int, high: int) -> int:
-    next_smaller_index = low - 1  # index of smaller element
-    pivot_index = random.randint(low, high)
-    pivot = arr[pivot_index]
-    swap(arr, pivot_index, high)
+def partition(
+    arr: List[T],
+    low: int,
+    high: int,
+    pivot: Optional[T] = None,
+    values: Optional[List[Any]] = None,
+) -> Tuple[int, int]:
+    """
+    3-way (Dutch flag) partition of `arr[low:high + 1]`: smaller items go
+    left, bigger items go right, items equal to `pivot` (chosen by
+    `choose_pivot` by default) end up in `arr[lt:gt + 1]`. Returns (lt, gt).
+    `values` (if any) get the same moves.
 
-    for j in range(low, high + 1):
-        if arr[j] <= pivot:
-            # put it to the next smaller index
-            next_smaller_index += 1
-            swap(arr, j, next_smaller_index)
+    >>> data = [3, 1, 3, 5, 0, 3]
+    >>> partition(data, 0, 5, pivot=3), data
+    ((2, 4), [1, 0, 3, 3, 3, 5])
+    """
+    if pivot is None:
+        pivot = choose_pivot(arr, low, high)
 
-    # next_smaller_index contains the reference to pivot (the highest element that is <= pivot)
-    return next_smaller_index
+    has_values = values is not None
+    lt = low  # arr[low:lt] < pivot
+    i = low  # arr[lt:i] == pivot
+    gt = high  # pivot < arr[gt + 1:high + 1]
+    while i <= gt:
+        value = arr[i]
+        if value < pivot:
+            arr[i] = arr[lt]
+            arr[lt] = value
+            if has_values:
+                values[i], values[lt] = values[lt], values[i]
+            lt += 1
+            i += 1
+        elif pivot < value:
+            arr[i] = arr[gt]
+            arr[gt] = value
+            if has_values:
+                values[i], values[gt] = values[gt], values[i]
+            gt -= 1
+        else:
+            i += 1
 
+    return lt, gt
 
-def quicksort_(array: List[T], begin: int, end: int):
-    if begin >= end:
-        return
-    pivot_index = partition(array, begin, end)
-    quicksort_(array, begin, pivot_index - 1)
-    quicksort_(array, pivot_index + 1, end)
+
+def choose_pivot(arr: List[T], low: int, high: int) -> T:
+    """
+    Median of the first, middle and last items, or Tukey's ninther (median
+    of 3 such medians) for long slices
+
+    >>> choose_pivot([5, 1, 9], 0, 2)
+    5
+    >>> choose_pivot(list(range(100)), 0, 99)
+    49
+    """
+    middle = (low + high) // 2
+    if high - low + 1 < NINTHER_SIZE:
+        return median_of_three(arr[low], arr[middle], arr[high])
+
+    step = (high - low) // 8
+    return median_of_three(
+        median_of_three(arr[low], arr[low + step], arr[low + 2 * step]),
+        median_of_three(arr[middle - step], arr[middle], arr[middle + step]),
+        median_of_three(arr[high - 2 * step], arr[high - step], arr[high]),
+    )
+
+
+def median_of_three(a: T, b: T, c: T) -> T:
+    if a < b:
+        if b < c:
+            return b
+        return c if a < c else a
+    if a < c:
+        return a
+    return c if b < c else b
+
+
+def insertion_sort(
+    arr: List[T], low: int, high: int, values: Optional[List[Any]] = None
+):
+    for i in range(low + 1, high + 1):
+        value = arr[i]
+        j = i - 1
+        while j >= low and value < arr[j]:
+            arr[j + 1] = arr[j]
+            j -= 1
+        arr[j + 1] = value
+        if values is not None and j + 1 < i:
+            moved = values[i]
+            values[j + 2 : i + 1] = values[j + 1 : i]
+            values[j + 1] = moved
+
+
+def heapsort(arr: List[T], low: int, high: int, values: Optional[List[Any]] = None):
+    """
+    Sort `arr[low:high + 1]` in place by heapsort: O(n log n) worst case,
+    no extra memory. `values` (if any) get the same moves.
+
+    The slice is a max-heap sifted by `sift_down_max`, the same sift-down
+    `MaxBinaryHeap` uses (which itself rejects duplicates and copies items).
+    """
+    length = high - low + 1
+    for index in range(length // 2 - 1, -1, -1):
+        sift_down_max(arr, index, length, low, values)
+    for end in range(length - 1, 0, -1):
+        swap(arr, low, low + end)
+        if values is not None:
+            swap(values, low, low + end)
+        sift_down_max(arr, 0, end, low, values)
+
+
+def quicksort_(
+    array: List[T],
+    begin: int,
+    end: int,
+    depth_limit: Optional[int] = None,
+    values: Optional[List[Any]] = None,
+):
+    """Sort `array[begin:end + 1]` in place, `values` (if any) get the same moves"""
+    if depth_limit is None:
+        depth_limit = 2 * max(1, end - begin + 1).bit_length()
+
+    while end - begin >= INSERTION_SORT_SIZE:
+        if depth_limit == 0:
+            heapsort(array, begin, end, values)
+            return
+        depth_limit -= 1
+
+        lt, gt = partition(array, begin, end, values=values)
+        # recursion on the smaller side only => O(log n) stack depth
+        if lt - begin < end - gt:
+            quicksort_(array, begin, lt - 1, depth_limit, values)
+            begin = gt + 1
+        else:
+            quicksort_(array, gt + 1, end, depth_limit, values)
+            end = lt - 1
+
+    insertion_sort(array, begin, end, values)
+
+
+def nth_element(
+    arr: List[T],
+    n: int,
+    low: int = 0,
+    high: Optional[int] = None,
+    depth_limit: Optional[int] = None,
+) -> T:
+    """
+    Move the item that would be at `arr[n]` after sorting `arr[low:high + 1]`
+    to `n`, with no bigger items before it and no smaller ones after it.
+    Returns the item.
+
+    Quickselect on `partition`, expected O(n). The slice must at least halve
+    every two partitions, otherwise (or once it has been partitioned
+    `depth_limit` times) the rest of the pivots are taken by
+    `median_of_medians`, so the worst case is O(n) too: the work done
+    before the switch is bounded by a geometric series.
+
+    >>> data = [5, 1, 4, 2, 3]
+    >>> nth_element(data, 2), data[:2], data[3:]
+    (3, [1, 2], [4, 5])
+    """
+    if high is None:
+        high = len(arr) - 1
+    if not low <= n <= high:
+        raise IndexError(n)
+    if depth_limit is None:
+        depth_limit = 2 * (high - low + 1).bit_length()
+
+    checked_size = high - low + 1
+    partitions = 0
+    while high - low >= INSERTION_SORT_SIZE:
+        if depth_limit > 0:
+            depth_limit -= 1
+            pivot = None
+        else:
+            pivot = median_of_medians(arr, low, high)
+
+        lt, gt = partition(arr, low, high, pivot)
+        if n < lt:
+            high = lt - 1
+        elif gt < n:
+            low = gt + 1
+        else:
+            return arr[n]
+
+        partitions += 1
+        if partitions % 2 == 0:
+            size = high - low + 1
+            if size > checked_size // 2:
+                # bad pivots => switch to median of medians for good
+                depth_limit = 0
+            checked_size = size
+
+    insertion_sort(arr, low, high)
+    return arr[n]
+
+
+def median_of_medians(arr: List[T], low: int, high: int) -> T:
+    """
+    Pivot that has at least ~30% of `arr[low:high + 1]` on each side: the
+    median of medians of groups of 5 items (groups get sorted in place)
+
+    >>> median_of_medians(list(range(25)), 0, 24)
+    12
+    """
+    medians = []
+    for start in range(low, high + 1, 5):
+        end = min(start + 4, high)
+        insertion_sort(arr, start, end)
+        medians.append(arr[(start + end) // 2])
+    return nth_element(medians, len(medians) // 2, depth_limit=0)
+
+
+def partial_sort(arr: List[T], k: int) -> List[T]:
+    """
+    Sort the `k` smallest items into `arr[:k]` in place, the order of the
+    rest is unspecified. O(n + k log k) instead of O(n log n).
+
+    >>> partial_sort([5, 1, 4, 2, 3, 0], 3)[:3]
+    [0, 1, 2]
+    """
+    k = min(k, len(arr))
+    if k <= 0:
+        return arr
+    nth_element(arr, k - 1)
+    quicksort_(arr, 0, k - 1)
+    return arr
+
+
+def top_k(arr: List[T], k: int) -> List[T]:
+    """
+    The `k` biggest items, the biggest first. Reorders `arr` in place.
+
+    >>> top_k([5, 1, 4, 2, 3], 2)
+    [5, 4]
+    """
+    k = min(k, len(arr))
+    if k <= 0:
+        return []
+    start = len(arr) - k
+    if start:
+        nth_element(arr, start)
+    quicksort_(arr, start, len(arr) - 1)
+    return arr[: start - 1 : -1] if start else arr[::-1]
+
+
+def top_k_stream(
+    items: Iterable[T], k: int, key: Optional[Callable[[T], Any]] = None
+) -> List[T]:
+    """
+    The `k` biggest items (by `key`) of an iterable of any length, the
+    biggest first. Keeps only a min-heap of `k` items: O(n log k) time,
+    O(k) memory. Items with equal keys keep their input order, so the result
+    is `sorted(items, key=key, reverse=True)[:k]`.
+
+    >>> top_k_stream(iter(range(100)), 3)
+    [99, 98, 97]
+    >>> top_k_stream(["bb", "a", "ccc", "dd"], 2, key=len)
+    ['ccc', 'bb']
+    """
+    if k <= 0:
+        return []
+    # the key is calculated once per item; on equal keys the later item is
+    # smaller, and (key, -index) pairs are unique => items are never compared
+    entries = (
+        (item if key is None else key(item), -index, item)
+        for index, item in enumerate(items)
+    )
+    heap = Heap(islice(entries, k))
+    if len(heap) == k:
+        smallest = heap.peek()
+        for entry in entries:
+            if smallest < entry:
+                heap.push_pop(entry)
+                smallest = heap.peek()
+    return [item for _key, _index, item in heap.pop_all()][::-1]
+
+
+def bench(sizes: Iterable[int]):
+    inputs: Dict[str, Callable[[int], List[int]]] = {
+        "random": lambda size: random.sample(range(size), size),
+        "sorted": lambda size: list(range(size)),
+        "reversed": lambda size: list(range(size, 0, -1)),
+        "few unique": lambda size: [random.randrange(4) for _ in range(size)],
+    }
+    sorts = {"quicksort": quicksort, "mergesort": mergesort, "sorted": sorted}
+
+    print("{:>10} {:>10} {:>12} {:>12} {:>12}".format("size", "data", *sorts))
+    for size in sizes:
+        for name, make_data in inputs.items():
+            data = make_data(size)
+            durations = []
+            for sort in sorts.values():
+                copy = list(data)
+                start = time.perf_counter()
+                sort(copy)
+                durations.append(time.perf_counter() - start)
+            print(
+                "{:>10} {:>10} {:>12.4f} {:>12.4f} {:>12.4f}".format(
+                    size, name, *durations
+                )
+            )
+
+
+def bench_select(sizes: Iterable[int], k: int = 100):
+    """Selection against a full sort: the median, and the `k` biggest items"""
+    tasks: Dict[str, Callable[[List[int]], Any]] = {
+        "quicksort": quicksort,
+        "sorted": sorted,
+        "nth_element": lambda data: nth_element(data, len(data) // 2),
+        "partial_sort": lambda data: partial_sort(data, k),
+        "top_k": lambda data: top_k(data, k),
+        "top_k_stream": lambda data: top_k_stream(iter(data), k),
+        "heapq": lambda data: heapq.nlargest(k, data),
+    }
+
+    print("{:>10} {:>10}".format("size", "data"), *map("{:>12}".format, tasks))
+    for size in sizes:
+        for name in ("random", "few unique"):
+            if name == "random":
+                data = random.sample(range(size), size)
+            else:
+                data = [random.randrange(4) for _ in range(size)]
+            durations = []
+            for task in tasks.values():
+                copy = list(data)
+                start = time.perf_counter()
+                task(copy)
+                durations.append(time.perf_counter() - start)
+            print(
+                "{:>10} {:>10}".format(size, name),
+                *map("{:>12.4f}".format, durations),
+            )
+
+
+class CostlyKey:
+    """Key function that takes a while and counts its calls"""
+
+    def __init__(self, rounds: int = 20):
+        self.rounds = rounds
+        self.calls = 0
+
+    def __call__(self, record: Tuple[int, ...]) -> int:
+        self.calls += 1
+        value = 0
+        for _ in range(self.rounds):
+            value = hash((value, record))
+        return record[0] * 10 + value % 10
+
+
+class RecomputedKey:
+    """Item wrapper that computes the key on every comparison"""
+
+    __slots__ = ("item", "key")
+
+    def __init__(self, item: T, key: Callable[[T], Any]):
+        self.item = item
+        self.key = key
+
+    def __lt__(self, other: "RecomputedKey") -> bool:
+        return self.key(self.item) < other.key(other.item)
+
+    def __le__(self, other: "RecomputedKey") -> bool:
+        return not other < self
+
+
+def bench_key(sizes: Iterable[int]):
+    """Sorting records by a costly key: computed once or on every comparison"""
+    runs: Dict[str, Callable[[List[Tuple[int, ...]], CostlyKey], Any]] = {
+        "quicksort(key=)": lambda data, key: quicksort(data, key=key),
+        "mergesort(key=)": lambda data, key: mergesort(data, key=key),
+        "sorted(key=)": lambda data, key: sorted(data, key=key),
+        "quicksort(recomputed)": lambda data, key: quicksort(
+            [RecomputedKey(item, key) for item in data]
+        ),
+        "mergesort(recomputed)": lambda data, key: mergesort(
+            [RecomputedKey(item, key) for item in data]
+        ),
+    }
+
+    print("{:>10} {:>22} {:>10} {:>10}".format("size", "sort", "time, s", "key calls"))
+    for size in sizes:
+        records = [tuple(random.randrange(100) for _ in range(5)) for _ in range(size)]
+        for name, run in runs.items():
+            key = CostlyKey()
+            data = list(records)
+            start = time.perf_counter()
+            run(data, key)
+            duration = time.perf_counter() - start
+            print(
+                "{:>10} {:>22} {:>10.4f} {:>10}".format(size, name, duration, key.calls)
+            )
+
+
+class TestQuicksort:
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 16, 17, 39, 40, 41, 100, 1000])
+    def test_random(self, size):
+        data = [random.randrange(size + 1) for _ in range(size)]
+        assert quicksort(list(data)) == sorted(data)
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            list(range(2000)),
+            list(range(2000, 0, -1)),
+            [0] * 2000,
+            [random.randrange(3) for _ in range(2000)],
+            list(range(1000)) + list(range(1000, 0, -1)),
+            list(range(10)) * 200,
+        ],
+    )
+    def test_patterns(self, data):
+        assert quicksort(list(data)) == sorted(data)
+
+    def test_duplicates_are_linear(self):
+        # would exceed the recursion limit with a 2-way partition
+        data = [1] * 100_000
+        assert quicksort(data) == [1] * 100_000
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 17, 100, 1000])
+    def test_heapsort(self, size):
+        data = [random.randrange(size // 2 + 1) for _ in range(size)]
+        copy = [-1] + data + [-1]
+        heapsort(copy, 1, size)
+        assert copy == [-1] + sorted(data) + [-1]
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 17, 100, 1000])
+    def test_heapsort_values(self, size):
+        data = [(random.randrange(size // 2 + 1), index) for index in range(size)]
+        keys = [-1] + [item[0] for item in data] + [-1]
+        values = [None] + list(data) + [None]
+        heapsort(keys, 1, size, values)
+        assert keys == [-1] + sorted(item[0] for item in data) + [-1]
+        assert values[0] is None and values[-1] is None
+        assert [item[0] for item in values[1:-1]] == keys[1:-1]
+        assert sorted(values[1:-1]) == sorted(data)
+
+    def test_depth_limit(self):
+        data = [random.randrange(50) for _ in range(1000)]
+        quicksort_(data, 0, len(data) - 1, depth_limit=0)
+        assert data == sorted(data)
+
+    @pytest.mark.parametrize("reverse", [False, True])
+    @pytest.mark.parametrize("size", [0, 1, 17, 100, 1000])
+    def test_key(self, size, reverse):
+        data = [(random.randrange(size // 3 + 1), index) for index in range(size)]
+        calls = []
+
+        def key(item):
+            calls.append(item)
+            return item[0]
+
+        result = quicksort(list(data), key=key, reverse=reverse)
+        assert len(calls) == size
+        assert [item[0] for item in result] == sorted(
+            (item[0] for item in data), reverse=reverse
+        )
+        assert sorted(result) == sorted(data)
+
+    def test_key_depth_limit(self):
+        data = [(random.randrange(50), index) for index in range(1000)]
+        keys = [item[0] for item in data]
+        quicksort_(keys, 0, len(data) - 1, depth_limit=1, values=data)
+        assert keys == sorted(keys)
+        assert [item[0] for item in data] == keys
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_partition(self, seed):
+        rnd = random.Random(seed)
+        data = [rnd.randrange(10) for _ in range(50)]
+        copy = list(data)
+        lt, gt = partition(copy, 5, 44)
+        assert copy[:5] == data[:5] and copy[45:] == data[45:]
+        assert sorted(copy[5:45]) == sorted(data[5:45])
+        pivot = copy[lt]
+        assert all(value < pivot for value in copy[5:lt])
+        assert all(value == pivot for value in copy[lt : gt + 1])
+        assert all(pivot < value for value in copy[gt + 1 : 45])
+
+
+class TestSelect:
+    @pytest.mark.parametrize("size", [1, 2, 16, 17, 100, 1000])
+    @pytest.mark.parametrize("unique", [3, 10 ** 6])
+    def test_nth_element(self, size, unique):
+        data = [random.randrange(unique) for _ in range(size)]
+        expected = sorted(data)
+        for n in {0, size // 2, size - 1, random.randrange(size)}:
+            copy = list(data)
+            assert nth_element(copy, n) == expected[n]
+            assert all(value <= copy[n] for value in copy[:n])
+            assert all(copy[n] <= value for value in copy[n + 1 :])
+
+    @pytest.mark.parametrize("size", [17, 100, 1000])
+    def test_median_of_medians(self, size):
+        data = [random.randrange(size) for _ in range(size)]
+        copy = list(data)
+        assert nth_element(copy, size // 3, depth_limit=0) == sorted(data)[size // 3]
+        pivot = median_of_medians(list(data), 0, size - 1)
+        assert sum(value < pivot for value in data) <= size * 0.7 + 5
+        assert sum(pivot < value for value in data) <= size * 0.7 + 5
+
+    @pytest.mark.parametrize("seed", range(20))
+    @pytest.mark.parametrize("size", [100, 1000])
+    def test_nth_element_bad_pivots(self, size, seed, monkeypatch):
+        module = sys.modules[__name__]
+        choose = choose_pivot
+        select = median_of_medians
+        data = random.Random(seed).sample(range(size), size)
+        calls = []
+
+        def choose_min(arr, low, high):
+            choose(arr, low, high)
+            return min(arr[low : high + 1])
+
+        def median_of_medians_spy(arr, low, high):
+            # only the fallback for `data`, not the selection among medians
+            if arr is data:
+                calls.append(high - low + 1)
+            return select(arr, low, high)
+
+        monkeypatch.setattr(module, "choose_pivot", choose_min)
+        monkeypatch.setattr(module, "median_of_medians", median_of_medians_spy)
+        assert nth_element(data, size - 1) == size - 1
+        # two partitions that peel off the minimum => median of medians,
+        # which cuts at least ~30% of the slice every time
+        assert calls and calls[0] == size - 2
+        assert len(calls) <= 2 * size.bit_length()
+
+    def test_nth_element_out_of_range(self):
+        with pytest.raises(IndexError):
+            nth_element([1, 2], 2)
+        with pytest.raises(IndexError):
+            nth_element([], 0)
+
+    @pytest.mark.parametrize("k", [-1, 0, 1, 5, 99, 100, 150])
+    def test_partial_sort(self, k):
+        data = [random.randrange(50) for _ in range(100)]
+        copy = partial_sort(list(data), k)
+        assert sorted(copy) == sorted(data)
+        assert copy[: max(k, 0)] == sorted(data)[: max(k, 0)]
+
+    @pytest.mark.parametrize("k", [-1, 0, 1, 5, 99, 100, 150])
+    def test_top_k(self, k):
+        data = [random.randrange(50) for _ in range(100)]
+        expected = sorted(data, reverse=True)[: max(k, 0)]
+        assert top_k(list(data), k) == expected
+        assert top_k_stream(iter(data), k) == expected
+
+    def test_top_k_stream_key(self):
+        data = [(random.randrange(50), index) for index in range(1000)]
+        result = top_k_stream(data, 10, key=lambda item: item[0])
+        assert result == sorted(data, key=lambda item: item[0], reverse=True)[:10]
+
+    def test_top_k_stream_ties(self):
+        data = [(value, index) for index, value in enumerate([1, 3, 3, 2, 3, 3])]
+        result = top_k_stream(data, 3, key=lambda item: item[0])
+        assert result == [(3, 1), (3, 2), (3, 4)]
+
+    def test_top_k_stream_key_calls(self):
+        calls = []
+
+        def key(item):
+            calls.append(item)
+            return item
+
+        assert top_k_stream(range(1000), 10, key=key) == list(range(999, 989, -1))
+        assert len(calls) == 1000
 
 
 if __name__ == "__main__":
     if len(sys.argv) == 2 and sys.argv[1] == "test":
         pytest.main(sys.argv[:1])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench-key":
+        bench_key([int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench-select":
+        bench_select([int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench([int(size) for size in sys.argv[2:]] or [10 ** 4, 10 ** 5])
     elif len(sys.argv) > 1:
         path, *values = sys.argv
         values = [int(value) for value in values]
@@ -68,5 +646,10 @@ if __name__ == "__main__":
         print(f"For values {' '.join(sys.argv[1:])} quicksort is {' '.join(result)}")
     else:
         file_path = Path(sys.argv[0]).name
-        print(f"Usage: {file_path} test OR {file_path} *<VALUE>", file=sys.stderr)
+        print(
+            f"Usage: {file_path} test OR {file_path} bench *<SIZE> "
+            f"OR {file_path} bench-select *<SIZE> OR {file_path} bench-key *<SIZE> "
+            f"OR {file_path} *<VALUE>",
+            file=sys.stderr,
+        )
         exit(1)
@@ -0,0 +1,315 @@
+# run this as:
+#   python3.9 -m algorithms.sort_radix
+import functools
+import random
+import sys
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
+import pytest
+
+from algorithms.sort_merge import get_typecode, mergesort
+from algorithms.sort_quick import quicksort
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+T = TypeVar("T", int, bytes)
+
+DIGIT_BITS = 8  # LSD radix sort takes one byte of a key per pass
+DIGIT_MASK = (1 << DIGIT_BITS) - 1
+PYTHON_SIZE_LIMIT = 10 ** 7  # bench skips pure Python sorts above this size
+COUNTING_RANGE = 2 ** 16  # bench skips counting sort for wider ranges
+
+
+def radix_sort(
+    args: Union[List[T], "numpy.ndarray"], use_numpy: bool = True
+) -> Union[List[T], "numpy.ndarray"]:
+    """
+    Sort ints (negative too) or byte strings of the same length in place by
+    LSD radix sort: one stable bucket pass per byte of the keys, O(n * w).
+
+    Integer numpy arrays are sorted by vectorized passes, so are lists of
+    64-bit ints when numpy is installed and `use_numpy` is set.
+
+    >>> radix_sort([170, -45, 75, -90, 802, 24, 2, 66])
+    [-90, -45, 2, 24, 66, 75, 170, 802]
+    >>> radix_sort([b"cab", b"abc", b"bca", b"abb"])
+    [b'abb', b'abc', b'bca', b'cab']
+    """
+    if numpy is not None and isinstance(args, numpy.ndarray):
+        args[...] = _radix_sort_numpy(args)
+        return args
+    if not args:
+        return args
+    if isinstance(args[0], bytes):
+        args[:] = _radix_sort_bytes(args)
+        return args
+    if use_numpy and numpy is not None and get_typecode(args) == "q":
+        args[:] = _radix_sort_numpy(numpy.array(args, dtype=numpy.int64)).tolist()
+        return args
+    args[:] = _radix_sort_ints(args)
+    return args
+
+
+def _radix_sort_ints(items: List[int]) -> List[int]:
+    low = min(items)
+    # keys are offsets from the minimum => negative values need no special pass
+    width = max(items) - low
+    shift = 0
+    while width >> shift:
+        buckets: List[List[int]] = [[] for _ in range(DIGIT_MASK + 1)]
+        for item in items:
+            buckets[((item - low) >> shift) & DIGIT_MASK].append(item)
+        items = list(chain.from_iterable(buckets))
+        shift += DIGIT_BITS
+    return items
+
+
+def _radix_sort_bytes(items: List[bytes]) -> List[bytes]:
+    width = len(items[0])
+    if any(len(item) != width for item in items):
+        raise ValueError("Byte strings must have the same length")
+
+    for position in range(width - 1, -1, -1):
+        buckets: List[List[bytes]] = [[] for _ in range(256)]
+        for item in items:
+            buckets[item[position]].append(item)
+        items = list(chain.from_iterable(buckets))
+    return items
+
+
+def _radix_sort_numpy(array: "numpy.ndarray") -> "numpy.ndarray":
+    if array.dtype.kind not in "iu":
+        raise ValueError("Only integer arrays are supported: {}".format(array.dtype))
+    if not len(array):
+        return array
+
+    if array.dtype.kind == "i":
+        # flipping the sign bit keeps the order of signed values as unsigned
+        unsigned = numpy.dtype("u{}".format(array.dtype.itemsize))
+        keys = array.view(unsigned) ^ unsigned.type(1 << (array.dtype.itemsize * 8 - 1))
+    else:
+        keys = array.copy()
+    keys = keys - keys.min()
+    width = int(keys.max())
+
+    order = numpy.arange(len(array))
+    shift = 0
+    while width >> shift:
+        digits = ((keys >> keys.dtype.type(shift)) & DIGIT_MASK).astype(numpy.uint8)
+        # a stable sort of one byte is a counting sort
+        order = order[numpy.argsort(digits[order], kind="stable")]
+        shift += DIGIT_BITS
+    return array[order]
+
+
+def counting_sort(
+    args: Union[List[int], "numpy.ndarray"],
+    low: Optional[int] = None,
+    high: Optional[int] = None,
+) -> Union[List[int], "numpy.ndarray"]:
+    """
+    Sort ints from `low` to `high` (the minimum and maximum by default) in
+    place by counting every value: O(n + high - low), for small ranges.
+
+    >>> counting_sort([3, 1, 2, 3, 1, 0, -1])
+    [-1, 0, 1, 1, 2, 3, 3]
+    >>> counting_sort([5, 7], low=0, high=4)
+    Traceback (most recent call last):
+    ...
+    ValueError: Value is out of range 0..4: 5
+    """
+    if not len(args):
+        return args
+    # Python ints: numpy scalars of small dtypes would wrap around below
+    low = int(min(args) if low is None else low)
+    high = int(max(args) if high is None else high)
+
+    if numpy is not None and isinstance(args, numpy.ndarray):
+        for value in (int(args.min()), int(args.max())):
+            if not low <= value <= high:
+                raise ValueError(
+                    "Value is out of range {}..{}: {}".format(low, high, value)
+                )
+        # offsets are taken modulo 2 ** bits in unsigned ints of the same width:
+        # right for any dtype, as `high - low` fits the width
+        unsigned = numpy.dtype("u{}".format(args.dtype.itemsize))
+        low_bits = unsigned.type(low % (1 << unsigned.itemsize * 8))
+        offsets = args.view(unsigned) - low_bits
+        counts = numpy.bincount(offsets.astype(numpy.intp), minlength=high - low + 1)
+        args[...] = numpy.repeat(numpy.arange(low, high + 1, dtype=args.dtype), counts)
+        return args
+
+    counts = [0] * (high - low + 1)
+    for value in args:
+        if not low <= value <= high:
+            raise ValueError(
+                "Value is out of range {}..{}: {}".format(low, high, value)
+            )
+        counts[value - low] += 1
+
+    position = 0
+    for value, count in enumerate(counts, low):
+        args[position : position + count] = [value] * count
+        position += count
+    return args
+
+
+def bench(sizes: Iterable[int]):
+    sorts: Dict[str, Callable[[List[int]], List[int]]] = {
+        "quicksort": quicksort,
+        "mergesort": mergesort,
+        "sorted": sorted,
+        "radix": functools.partial(radix_sort, use_numpy=False),
+        "counting": counting_sort,
+    }
+    if numpy is not None:
+        sorts["radix numpy"] = radix_sort
+        sorts["numpy.sort"] = numpy.sort
+
+    print("{:>10} {:>10}".format("size", "values"), *map("{:>12}".format, sorts))
+    for size in sizes:
+        for name, high in (("32-bit", 2 ** 32), ("16-bit", 2 ** 16)):
+            if size > PYTHON_SIZE_LIMIT:
+                # no list of Python ints this big: only numpy sorts are run
+                if numpy is None:
+                    continue
+                data = []
+                array = numpy.random.randint(0, high, size=size, dtype=numpy.int64)
+            else:
+                data = [random.randrange(high) for _ in range(size)]
+                array = numpy.array(data, dtype=numpy.int64) if numpy else None
+            durations = []
+            for sort_name, sort in sorts.items():
+                numeric = sort_name in ("radix numpy", "numpy.sort")
+                too_big = not numeric and size > PYTHON_SIZE_LIMIT
+                if too_big or (sort_name == "counting" and high > COUNTING_RANGE):
+                    durations.append("-")
+                    continue
+                copy = array.copy() if numeric else list(data)
+                start = time.perf_counter()
+                sort(copy)
+                durations.append("{:.4f}".format(time.perf_counter() - start))
+            print("{:>10} {:>10}".format(size, name), *map("{:>12}".format, durations))
+
+
+class TestRadixSort:
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    @pytest.mark.parametrize("size", [0, 1, 2, 100, 1000])
+    @pytest.mark.parametrize(
+        "low, high", [(0, 10), (0, 2 ** 32), (-(2 ** 63), 2 ** 63)]
+    )
+    def test_ints(self, use_numpy, size, low, high):
+        data = [random.randrange(low, high) for _ in range(size)]
+        assert radix_sort(list(data), use_numpy=use_numpy) == sorted(data)
+
+    def test_big_ints(self):
+        data = [random.randrange(-(2 ** 100), 2 ** 100) for _ in range(100)]
+        assert radix_sort(list(data)) == sorted(data)
+
+    @pytest.mark.parametrize("dtype", ["int8", "int32", "int64", "uint16", "uint64"])
+    def test_numpy(self, dtype):
+        if numpy is None:
+            pytest.skip("numpy is not installed")
+        info = numpy.iinfo(dtype)
+        data = numpy.random.randint(info.min, info.max, size=1000, dtype=dtype)
+        data[:2] = info.min, info.max
+        expected = numpy.sort(data)
+        assert radix_sort(data) is data
+        assert (data == expected).all()
+
+    def test_numpy_float(self):
+        if numpy is None:
+            pytest.skip("numpy is not installed")
+        with pytest.raises(ValueError):
+            radix_sort(numpy.array([0.5, 1.5]))
+
+    def test_bytes(self):
+        data = [random.randbytes(4) for _ in range(1000)]
+        assert radix_sort(list(data)) == sorted(data)
+        with pytest.raises(ValueError):
+            radix_sort([b"ab", b"c"])
+
+    def test_stable(self):
+        class Tagged(bytes):
+            index: int
+
+        data = []
+        for index in range(1000):
+            item = Tagged(random.choice([b"ab", b"ba", b"bb"]))
+            item.index = index
+            data.append(item)
+        result = radix_sort(list(data))
+        assert [item.index for item in result] == [item.index for item in sorted(data)]
+
+
+class TestCountingSort:
+    @pytest.mark.parametrize("dtype", ["int8", "int16", "uint8"])
+    def test_small_dtypes(self, dtype):
+        if numpy is None:
+            pytest.skip("numpy is not installed")
+        info = numpy.iinfo(dtype)
+        data = numpy.random.randint(info.min, int(info.max) + 1, size=1000, dtype=dtype)
+        data[:2] = info.min, info.max
+        expected = numpy.sort(data)
+        assert counting_sort(data) is data
+        assert (data == expected).all()
+
+    def test_uint64(self):
+        if numpy is None:
+            pytest.skip("numpy is not installed")
+        data = numpy.array([2 ** 64 - 1, 2 ** 64 - 2, 2 ** 64 - 1], dtype=numpy.uint64)
+        assert counting_sort(data).tolist() == [2 ** 64 - 2, 2 ** 64 - 1, 2 ** 64 - 1]
+        data = numpy.array([2 ** 63 + 5, 2 ** 63 - 5], dtype=numpy.uint64)
+        assert counting_sort(data).tolist() == [2 ** 63 - 5, 2 ** 63 + 5]
+
+    def test_int8_range(self):
+        if numpy is None:
+            pytest.skip("numpy is not installed")
+        data = numpy.array([-100, 100, 5], dtype="int8")
+        assert counting_sort(data).tolist() == [-100, 5, 100]
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    @pytest.mark.parametrize("size", [0, 1, 100, 1000])
+    def test_sort(self, use_numpy, size):
+        if use_numpy and numpy is None:
+            pytest.skip("numpy is not installed")
+        data = [random.randrange(-50, 50) for _ in range(size)]
+        array = numpy.array(data) if use_numpy else list(data)
+        assert list(counting_sort(array)) == sorted(data)
+
+    def test_range(self):
+        assert counting_sort([3, 1], low=0, high=10) == [1, 3]
+        with pytest.raises(ValueError):
+            counting_sort([3, 11], low=0, high=10)
+        if numpy is not None:
+            with pytest.raises(ValueError, match=r"^Value is out of range 0..10: 11$"):
+                counting_sort(numpy.array([3, 11]), low=0, high=10)
+            with pytest.raises(ValueError, match=r"^Value is out of range 0..10: -1$"):
+                counting_sort(numpy.array([3, -1]), low=0, high=10)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "test":
+        pytest.main(sys.argv[:1])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench([int(size) for size in sys.argv[2:]] or [10 ** 5, 10 ** 6])
+    elif len(sys.argv) > 1:
+        path, *values = sys.argv
+        values = [int(value) for value in values]
+        result = radix_sort(values)
+        result = (str(x) for x in result)
+        print(f"For values {' '.join(sys.argv[1:])} radix sort is {' '.join(result)}")
+    else:
+        file_path = Path(sys.argv[0]).name
+        print(
+            f"Usage: {file_path} test OR {file_path} bench *<SIZE> "
+            f"OR {file_path} *<VALUE>",
+            file=sys.stderr,
+        )
+        exit(1)
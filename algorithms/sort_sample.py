@@ -0,0 +1,395 @@
+# run this as:
+#   python3.9 -m algorithms.sort_sample
+import array
+import contextlib
+import functools
+import os
+import random
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import pytest
+
+from algorithms.sort_merge import get_typecode, mergesort, pairwise
+from algorithms.sort_quick import quicksort
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+T = TypeVar("T")
+
+OVERSAMPLING = 32  # sampled items per bucket, splitters are picked from them
+
+Segment = Tuple[int, int]  # start, length
+
+
+def sample_sort(
+    args: List[T],
+    key: Optional[Callable[[T], Any]] = None,
+    reverse: bool = False,
+    *,
+    workers: Optional[int] = None,
+    min_size: int = 10 ** 5,
+) -> List[T]:
+    """
+    Sort `args` in place on `workers` processes (one per CPU by default),
+    not stable. Inputs shorter than `min_size` are sorted by `quicksort` in
+    process.
+
+    Splitters picked from a random sample cut the values into one bucket per
+    worker. Every worker groups its chunk of the input by bucket, then every
+    worker gathers one bucket and sorts it with `quicksort` (or with numpy
+    for numbers, when it is installed). Buckets go in order, so the sorted
+    buckets make the sorted list. Lists of plain ints (64-bit) or floats
+    stay in shared memory, other items are pickled to workers.
+
+    `key(item)` is called once per item in this process (`key` may not be
+    picklable): workers sort `(key, index)` pairs, then items are moved to
+    their places here.
+
+    >>> data = [random.randrange(1000) for _ in range(1000)]
+    >>> sample_sort(list(data), workers=2, min_size=0) == sorted(data)
+    True
+    >>> sample_sort(["bb", "a", "ccc"], len, True, workers=2, min_size=0)
+    ['ccc', 'bb', 'a']
+    """
+    length = len(args)
+    workers = min(workers or os.cpu_count() or 1, max(1, length))
+    if workers == 1 or length < min_size:
+        return quicksort(args, key=key, reverse=reverse)
+
+    if key is not None:
+        pairs = [(key(item), index) for index, item in enumerate(args)]
+        sample_sort(pairs, workers=workers, min_size=0)
+        args[:] = [args[index] for _key, index in pairs]
+    else:
+        sort_in_workers(args, workers)
+    if reverse:
+        args.reverse()
+    return args
+
+
+def sort_in_workers(args: List[T], workers: int):
+    length = len(args)
+    splitters = get_splitters(args, workers)
+    bounds = [length * i // workers for i in range(workers + 1)]
+    typecode = get_typecode(args)
+    with ProcessPoolExecutor(workers) as executor:
+        if typecode is None:
+            sort_pickled(executor, args, bounds, splitters)
+        else:
+            sort_shared(executor, args, bounds, splitters, typecode)
+
+
+def get_splitters(
+    items: Sequence[T], buckets: int, oversampling: int = OVERSAMPLING
+) -> List[T]:
+    """
+    `buckets - 1` values that cut a random sample of `items` into equal parts
+
+    >>> get_splitters(list(range(1000)), 1)
+    []
+    >>> get_splitters([5] * 1000, 3)
+    [5, 5]
+    """
+    sample = random.sample(items, min(len(items), buckets * oversampling))
+    quicksort(sample)
+    return [sample[len(sample) * i // buckets] for i in range(1, buckets)]
+
+
+def split_into_buckets(items: Iterable[T], splitters: List[T]) -> List[List[T]]:
+    """
+    Items equal to splitters are spread round-robin over the buckets around
+    those splitters, so many duplicates do not end up in a single bucket
+
+    >>> split_into_buckets([5, 1, 3, 4, 3, 0], [2, 4])
+    [[1, 0], [3, 4, 3], [5]]
+    >>> [len(bucket) for bucket in split_into_buckets([5] * 900, [5, 5])]
+    [300, 300, 300]
+    """
+    buckets = [[] for _ in range(len(splitters) + 1)]
+    ties = 0
+    for item in items:
+        index = bisect_right(splitters, item)
+        if index and not splitters[index - 1] < item:
+            # the buckets between equal splitters can hold only this value
+            first = bisect_left(splitters, item, 0, index)
+            index = first + ties % (index - first + 1)
+            ties += 1
+        buckets[index].append(item)
+    return buckets
+
+
+def sort_pickled(
+    executor: ProcessPoolExecutor,
+    args: List[T],
+    bounds: List[int],
+    splitters: List[T],
+):
+    chunks = (args[start:end] for start, end in pairwise(bounds))
+    chunks_buckets = list(executor.map(split_into_buckets, chunks, repeat(splitters)))
+    buckets = (
+        list(chain.from_iterable(buckets[index] for buckets in chunks_buckets))
+        for index in range(len(splitters) + 1)
+    )
+    position = 0
+    for bucket in executor.map(quicksort, buckets):
+        args[position : position + len(bucket)] = bucket
+        position += len(bucket)
+
+
+def sort_shared(
+    executor: ProcessPoolExecutor,
+    args: List[T],
+    bounds: List[int],
+    splitters: List[T],
+    typecode: str,
+):
+    size = len(args) * array.array(typecode).itemsize
+    source = shared_memory.SharedMemory(create=True, size=size)
+    target = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        with cast(source, typecode) as view:
+            view[:] = array.array(typecode, args)
+
+        group = functools.partial(group_shared_chunk, source.name, typecode, splitters)
+        chunks_counts = list(executor.map(group, bounds[:-1], bounds[1:]))
+
+        # segments of every bucket in the grouped chunks, in chunk order
+        buckets_segments: List[List[Segment]] = [[] for _ in splitters] + [[]]
+        for start, counts in zip(bounds, chunks_counts):
+            for segments, count in zip(buckets_segments, counts):
+                segments.append((start, count))
+                start += count
+
+        starts = [0]
+        for segments in buckets_segments[:-1]:
+            starts.append(starts[-1] + sum(count for _start, count in segments))
+
+        gather = functools.partial(
+            sort_shared_bucket, source.name, target.name, typecode
+        )
+        list(executor.map(gather, buckets_segments, starts))
+
+        with cast(target, typecode) as view:
+            args[:] = view.tolist()
+    finally:
+        for memory in (source, target):
+            memory.close()
+            memory.unlink()
+
+
+@contextlib.contextmanager
+def cast(memory: shared_memory.SharedMemory, typecode: str) -> Iterator[memoryview]:
+    view = memory.buf.cast(typecode)
+    try:
+        yield view
+    finally:
+        view.release()
+
+
+@contextlib.contextmanager
+def attach(name: str) -> Iterator[shared_memory.SharedMemory]:
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        yield memory
+    finally:
+        memory.close()
+
+
+def group_shared_chunk(
+    name: str, typecode: str, splitters: List[T], start: int, end: int
+) -> List[int]:
+    """Group items of the chunk by bucket in place, return bucket lengths"""
+    with attach(name) as memory, cast(memory, typecode) as view:
+        buckets = split_into_buckets(view[start:end].tolist(), splitters)
+        view[start:end] = array.array(typecode, chain.from_iterable(buckets))
+    return [len(bucket) for bucket in buckets]
+
+
+def sort_shared_bucket(
+    source_name: str,
+    target_name: str,
+    typecode: str,
+    segments: List[Segment],
+    target_start: int,
+):
+    """Copy segments of the bucket one after another to the target, sort them"""
+    with attach(source_name) as source, attach(target_name) as target:
+        if numpy is not None:
+            itemsize = numpy.dtype(typecode).itemsize
+            parts = result = None
+            try:
+                parts = [
+                    numpy.frombuffer(source.buf, typecode, count, start * itemsize)
+                    for start, count in segments
+                ]
+                bucket = numpy.concatenate(parts)
+                bucket.sort()
+                result = numpy.frombuffer(
+                    target.buf, typecode, len(bucket), target_start * itemsize
+                )
+                result[:] = bucket
+            finally:
+                # views must be gone before shared memory is closed
+                del parts, result
+            return
+
+        with cast(source, typecode) as view:
+            bucket = []
+            for start, count in segments:
+                bucket.extend(view[start : start + count].tolist())
+        quicksort(bucket)
+        with cast(target, typecode) as view:
+            view[target_start : target_start + len(bucket)] = array.array(
+                typecode, bucket
+            )
+
+
+def bench(size: int = 10 ** 6, max_workers: Optional[int] = None):
+    """Speedup of `sample_sort` over `quicksort` for 1..N workers"""
+    data = [random.randrange(2 ** 32) for _ in range(size)]
+    for name, sort in (("quicksort", quicksort), ("mergesort", mergesort)):
+        start = time.perf_counter()
+        sort(list(data))
+        print("{:>12} {:>10.3f}".format(name, time.perf_counter() - start))
+    start = time.perf_counter()
+    sorted(data)
+    print("{:>12} {:>10.3f}".format("sorted", time.perf_counter() - start))
+
+    print("{:>12} {:>10} {:>8}".format("workers", "time, s", "speedup"))
+    for workers in range(1, (max_workers or os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        sample_sort(list(data), workers=workers, min_size=0)
+        duration = time.perf_counter() - start
+        if workers == 1:
+            single = duration
+        print("{:>12} {:>10.3f} {:>8.2f}".format(workers, duration, single / duration))
+
+
+class TestSampleSort:
+    @pytest.mark.parametrize("workers", [1, 2, 3])
+    @pytest.mark.parametrize(
+        "make_item",
+        [
+            lambda value: value,
+            lambda value: value - 2 ** 63,
+            lambda value: value / 7,
+            lambda value: str(value),
+            lambda value: 2 ** 70 + value,
+        ],
+    )
+    def test_sort(self, workers, make_item):
+        data = [make_item(random.randrange(1000)) for _ in range(1001)]
+        result = sample_sort(list(data), workers=workers, min_size=0)
+        assert result == sorted(data)
+
+    @pytest.mark.parametrize("values", [1, 2, 10])
+    def test_few_unique(self, values):
+        data = [random.randrange(values) for _ in range(1000)]
+        assert sample_sort(list(data), workers=3, min_size=0) == sorted(data)
+
+    def test_duplicates_spread(self):
+        data = [1] * 100 + [2] * 800 + [3] * 100
+        random.shuffle(data)
+        buckets = split_into_buckets(data, [2, 2, 2])
+        assert [len(bucket) for bucket in buckets] == [300, 200, 200, 300]
+        assert list(chain.from_iterable(map(sorted, buckets))) == sorted(data)
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 5])
+    def test_small(self, size):
+        data = list(range(size, 0, -1))
+        assert sample_sort(data, workers=4, min_size=0) == sorted(data)
+
+    def test_in_process(self):
+        data = [3, 1, 2]
+        assert sample_sort(data, workers=4) is data
+        assert data == [1, 2, 3]
+
+    @pytest.mark.parametrize("reverse", [False, True])
+    @pytest.mark.parametrize("min_size", [0, 10 ** 5])
+    def test_key(self, reverse, min_size):
+        data = [(random.randrange(100), str(index)) for index in range(1000)]
+        calls = []
+
+        def key(item):
+            calls.append(item)
+            return item[0]
+
+        result = sample_sort(list(data), key, reverse, workers=3, min_size=min_size)
+        assert len(calls) == len(data)
+        assert [item[0] for item in result] == sorted(
+            (item[0] for item in data), reverse=reverse
+        )
+        assert sorted(result) == sorted(data)
+
+    def test_reverse(self):
+        data = [random.randrange(1000) for _ in range(1000)]
+        result = sample_sort(list(data), workers=2, min_size=0, reverse=True)
+        assert result == sorted(data, reverse=True)
+
+    @pytest.fixture
+    def shared(self):
+        """Shared source with random ints in two segments and a target"""
+        data = [random.randrange(1000) for _ in range(1000)]
+        source = shared_memory.SharedMemory(create=True, size=len(data) * 8)
+        target = shared_memory.SharedMemory(create=True, size=len(data) * 8)
+        try:
+            with cast(source, "q") as view:
+                view[:] = array.array("q", data)
+            yield data, source, target
+        finally:
+            for memory in (source, target):
+                memory.close()
+                memory.unlink()
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_sort_shared_bucket(self, shared, use_numpy, monkeypatch):
+        if not use_numpy:
+            monkeypatch.setattr(sys.modules[__name__], "numpy", None)
+        elif numpy is None:
+            pytest.skip("numpy is not installed")
+        data, source, target = shared
+        segments = [(0, 300), (500, 200)]
+        sort_shared_bucket(source.name, target.name, "q", segments, 100)
+        with cast(target, "q") as view:
+            assert view[100:600].tolist() == sorted(data[:300] + data[500:700])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "test":
+        pytest.main(sys.argv[:1])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench(*[int(value) for value in sys.argv[2:4]])
+    elif len(sys.argv) > 1:
+        path, *values = sys.argv
+        values = [int(value) for value in values]
+        result = sample_sort(values)
+        result = (str(x) for x in result)
+        print(f"For values {' '.join(sys.argv[1:])} sample sort is {' '.join(result)}")
+    else:
+        file_path = Path(sys.argv[0]).name
+        print(
+            f"Usage: {file_path} test OR {file_path} bench [<SIZE> [<MAX_WORKERS>]] "
+            f"OR {file_path} *<VALUE>",
+            file=sys.stderr,
+        )
+        exit(1)
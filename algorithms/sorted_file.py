@@ -0,0 +1,223 @@
+# run this as:
+#   python3.9 -m algorithms.sorted_file
+
+from __future__ import annotations
+
+import bisect
+import logging
+import mmap
+import struct
+import sys
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, TypeVar, Union, overload
+
+import pytest
+
+from algorithms.binary_search import get_index_binary, var_counter
+from algorithms.counter import get_counter
+
+MAGIC = b"SRTD"
+FORMAT_SIZE = 12  # longest record format (struct module syntax)
+HEADER = struct.Struct("4s{}s".format(FORMAT_SIZE))  # magic + record format
+
+T = TypeVar("T")
+
+
+def main():
+    logging.getLogger().setLevel(logging.DEBUG)
+    pytest.main(sys.argv)
+
+
+def write_sorted_file(path: Union[str, Path], keys: Iterable[T], fmt: str = "q") -> int:
+    """
+    Write sorted `keys` as fixed-width records packed with `fmt`.
+
+    Keys are streamed, so `keys` may be a generator. Returns the number of
+    written records.
+    """
+    if len(fmt.encode("ascii")) > FORMAT_SIZE:
+        raise ValueError(
+            "Record format is longer than {} chars: {!r}".format(FORMAT_SIZE, fmt)
+        )
+    record = struct.Struct(fmt)
+    count = 0
+    previous = None
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, fmt.encode("ascii")))
+        for key in keys:
+            if count and key < previous:
+                raise ValueError(
+                    "Keys are not sorted: {!r} < {!r}".format(key, previous)
+                )
+            file.write(record.pack(key))
+            previous = key
+            count += 1
+
+    return count
+
+
+class SortedFile(Sequence[T]):
+    """
+    Read-only sequence of records written by `write_sorted_file`.
+
+    Records are read straight from the memory-mapped file. When `sample` is
+    enabled, the first key of every `sample_stride`-th page is kept in
+    memory, so `find` only binary searches the `sample_stride` pages where
+    the key may live: one or two pages by default.
+
+    The trade-off: opening reads one page in `sample_stride` and the sample
+    holds one key per `sample_stride` pages, while `find` touches up to
+    `log2(sample_stride) + 1` pages. Raise the stride for big files that are
+    opened often and searched rarely.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], sample: bool = True, sample_stride: int = 1
+    ):
+        if sample_stride < 1:
+            raise ValueError("Sample stride must be at least 1")
+        self.file = open(path, "rb")
+        try:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.file.close()
+            raise ValueError("Not a sorted file: {}".format(path))
+
+        if len(self.mmap) < HEADER.size or self.mmap[:4] != MAGIC:
+            self.close()
+            raise ValueError("Not a sorted file: {}".format(path))
+        _magic, fmt = HEADER.unpack_from(self.mmap)
+
+        self.record = struct.Struct(fmt.rstrip(b"\0").decode("ascii"))
+        self.length = (len(self.mmap) - HEADER.size) // self.record.size
+        self.page_length = max(1, mmap.PAGESIZE // self.record.size)
+        self.block_length = self.page_length * sample_stride
+        self.sample: Optional[List[T]] = None
+        if sample:
+            self.sample = [self[i] for i in range(0, self.length, self.block_length)]
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self) -> SortedFile[T]:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.length
+
+    @overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[T]:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        offset = HEADER.size + index * self.record.size
+        return self.record.unpack_from(self.mmap, offset)[0]
+
+    def find(self, value: T) -> Optional[int]:
+        if self.sample is None:
+            return get_index_binary(self, value)
+
+        block = bisect.bisect_right(self.sample, value) - 1
+        if block < 0:
+            return None
+
+        start = block * self.block_length
+        end = min(start + self.block_length, self.length)
+        index = bisect.bisect_left(self, value, start, end)
+        if index < end and self[index] == value:
+            return index
+        return None
+
+
+class TestSortedFile:
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = tmp_path / "keys.srtd"
+        assert write_sorted_file(path, range(1000, 11000, 2)) == 5000
+        return path
+
+    def test_sequence(self, path):
+        with SortedFile(path) as data:
+            assert len(data) == 5000
+            assert data[0] == 1000
+            assert data[-1] == 10998
+            assert data[1:4] == [1002, 1004, 1006]
+            assert list(data) == list(range(1000, 11000, 2))
+            with pytest.raises(IndexError):
+                data[5000]
+
+    @pytest.mark.parametrize(
+        "sample, sample_stride", [(True, 1), (True, 2), (True, 64), (False, 64)]
+    )
+    def test_find(self, path, sample, sample_stride):
+        with SortedFile(path, sample=sample, sample_stride=sample_stride) as data:
+            for value in range(990, 11010):
+                expected = (value - 1000) // 2 if value % 2 == 0 else None
+                if not 1000 <= value < 11000:
+                    expected = None
+                assert data.find(value) == expected
+
+    def test_get_index_binary(self, path):
+        with SortedFile(path) as data:
+            with get_counter(var_counter, get_index_binary) as counter:
+                index = get_index_binary(data, 5000)
+            assert index == 2000
+            assert counter.value <= 13
+
+    def test_bytes(self, tmp_path):
+        path = tmp_path / "keys.srtd"
+        keys = sorted({"{:04}".format(i * 7 % 1000).encode() for i in range(1000)})
+        write_sorted_file(path, iter(keys), fmt="4s")
+        with SortedFile(path) as data:
+            assert list(data) == keys
+            assert data.find(b"0007") == keys.index(b"0007")
+            assert data.find(b"abcd") is None
+
+    def test_empty(self, tmp_path):
+        path = tmp_path / "keys.srtd"
+        write_sorted_file(path, [])
+        with SortedFile(path) as data:
+            assert len(data) == 0
+            assert data.find(1) is None
+            assert get_index_binary(data, 1) is None
+
+    def test_not_sorted(self, tmp_path):
+        with pytest.raises(ValueError):
+            write_sorted_file(tmp_path / "keys.srtd", [1, 3, 2])
+
+    @pytest.mark.parametrize("sample_stride", [1, 4])
+    def test_sample_size(self, path, sample_stride):
+        block_length = mmap.PAGESIZE // 8 * sample_stride  # 8-byte records
+        with SortedFile(path, sample_stride=sample_stride) as data:
+            assert len(data.sample) == -(-5000 // block_length)
+            assert data.sample == list(range(1000, 11000, 2))[::block_length]
+
+    @pytest.mark.parametrize("content", [b"", b"SRTD", b"\0" * 32])
+    def test_not_sorted_file(self, tmp_path, content):
+        path = tmp_path / "keys.srtd"
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            SortedFile(path)
+
+    def test_long_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            write_sorted_file(tmp_path / "keys.srtd", [1], fmt="<" + "q" * 12)
+
+
+if __name__ == "__main__":
+    main()